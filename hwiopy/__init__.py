@@ -31,6 +31,20 @@ hwiopy: A common API for hardware input/output access.
 from . import core
 from .core import *
 
-# Submodules
-from . import platforms
-from . import systems
\ No newline at end of file
+# Global dependencies
+import importlib
+
+# Submodules. These (and the hardware maps) are only imported on first use, so
+# that scripts only pay for what they actually touch.
+_lazy_submodules = ('platforms', 'systems')
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        # Importing sets the attribute on the package, so this only happens
+        # once per submodule
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' +
+        repr(name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_submodules))
\ No newline at end of file
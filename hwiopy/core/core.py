@@ -35,18 +35,89 @@ Will probably need to add a virtual terminal at some point? Or maybe the
 generic SoC defines terminals available in the fallback sysFS mappings? 
 Or summat.
 
-WILL NEED TO BE MADE THREADSAFE AT SOME POINT. THIS IS EXTREMELY DANGEROUS TO
-RUN THREADED AT THE MOMENT.
+Threading: declaring, configuring, starting, and stopping belong to a single
+thread. While running, whether pins can be used from several threads at once
+is up to the system; see its docstring (the cortexA8 system allows it).
 '''
 
 # Global imports
+import os
 from warnings import warn
 
+def _not_running(*args, **kwargs):
+    ''' Placeholder for a pin's fast methods while its device is stopped.
+    '''
+    raise RuntimeError('Fast pin methods are only available while the '
+        'device is running, and only for modes that support them.')
+
+def _no_op(*args, **kwargs):
+    ''' Default on_start, on_stop and config for modes that don't need them.
+    Shared by every pin, instead of a fresh lambda apiece.
+    '''
+    pass
+
+def _load_spec(path):
+    ''' Loads a pinout spec (see Device.configure) from a .json or .toml
+    file.
+    '''
+    path = os.fspath(path)
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        # Before python 3.11, it's the (optional) tomli package
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise RuntimeError('Reading TOML needs python 3.11 or the '
+                    'tomli package.')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    else:
+        import json
+        with open(path, 'r') as f:
+            return json.load(f)
+
 class Pin():
     ''' A generic single channel for communication on a device. Pins connect
     to the 'outside world'.
 
+    Pin.high(), Pin.low(), Pin.read():
+    ======================================================
+
+    The fast path. These are rebound by the device on start, with everything
+    they need already bound in, so calling them costs about as little as 
+    python allows. Unlike the methods dict versions, they don't update 
+    pin.value. Until the device is started (or for modes that don't support
+    them), they raise RuntimeError.
+
+    Pin.wait_for_edge():
+    ======================================================
+
+    Coroutine that waits for the next edge on the pin, without blocking the 
+    event loop. Only available while the device is running, and only for 
+    modes that support it (RuntimeError otherwise).
+
+        level = await pin.wait_for_edge('rising', timeout=1)
+
+    *args
+    ------------------------------------------------------
+
+    edge='both'         str             'rising', 'falling', or 'both'
+    timeout=None        float           Seconds, after which TimeoutError
+
+    return
+    ------------------------------------------------------
+
+    int                 The new level of the pin, 0 or 1
     '''
+    # There can be a lot of pins, and they're all the same shape, so skip the
+    # per-instance __dict__. Note that this means pins don't take arbitrary
+    # attributes.
+    __slots__ = ('name', 'num', 'mode', 'value', 'terminal', 'register_name',
+        'on_start', 'on_stop', 'config', '_fast_methods', '_edge_future',
+        'methods', 'high', 'low', 'read', 'location')
+
     def __init__(self, terminal, mode, methods=None, name=None, pin_num=None):
         # An optional, nice, human-readable name.
         self.name = name
@@ -66,24 +137,27 @@ class Pin():
         # Dict for holding the pin's methods:
         if methods:
             # Need to always have on_start, on_stop, and config methods.
-            # Pop them from the methods dict, or if they don't exist, create
-            # them as empty lambdas.
-            if 'on_start' not in methods:
-                self.on_start = lambda: None
-            else:
-                self.on_start = methods.pop('on_start')
-            if 'on_stop' not in methods:
-                self.on_stop = lambda: None
-            else:
-                self.on_stop = methods.pop('on_stop')
-            if 'config' not in methods:
-                self.config = lambda: None
-            else:
-                self.config = methods.pop('config')
+            # Pop them from the methods dict, or if they don't exist, use 
+            # the shared no-op.
+            self.on_start = methods.pop('on_start', _no_op)
+            self.on_stop = methods.pop('on_stop', _no_op)
+            self.config = methods.pop('config', _no_op)
+            # Optional: callable returning the specialized fast methods
+            self._fast_methods = methods.pop('fast_methods', None)
+            # Optional: callable returning a future for the next edge
+            self._edge_future = methods.pop('edge_future', None)
         else:
             methods = {}
+            self.on_start = _no_op
+            self.on_stop = _no_op
+            self.config = _no_op
+            self._fast_methods = None
+            self._edge_future = None
         self.methods = methods
 
+        # Fast methods don't exist until the device starts
+        self.unbind_fast_methods()
+
         # It might be nice to be able to use 
         #   with pin as pin:
         # You'd need to reference the system, because you'd have to start it
@@ -100,12 +174,49 @@ class Pin():
         # Deprecate?
         self.location = None
 
+    def bind_fast_methods(self):
+        ''' Replaces high(), low(), read() with versions specialized for the
+        started pin. Called by the device after the pin's on_start.
+        '''
+        if self._fast_methods:
+            for name, method in self._fast_methods().items():
+                setattr(self, name, method)
+
+    def unbind_fast_methods(self):
+        ''' Resets the fast methods. Called by the device before the pin's 
+        on_stop, so nothing can poke at memory that's about to be unmapped.
+        '''
+        self.high = _not_running
+        self.low = _not_running
+        self.read = _not_running
+
+    async def wait_for_edge(self, edge='both', timeout=None):
+        if not self._edge_future:
+            raise RuntimeError('Mode ' + str(self.mode) + ' does not support '
+                'waiting for edges.')
+        # Only imported here, since it's slow to import and anyone awaiting 
+        # this has already imported it anyways
+        import asyncio
+        return await asyncio.wait_for(self._edge_future(edge), timeout)
+
 class Plug():
     ''' A base object for any multiple-pin interface, for example, SPI.
     '''
     def __init__(self):
+        # An optional, nice, human-readable name.
+        self.name = None
         self.pins = {}
 
+    def on_start(self):
+        ''' Called by the device after all of its pins have been started.
+        '''
+        pass
+
+    def on_stop(self):
+        ''' Called by the device before any of its pins are stopped.
+        '''
+        pass
+
 class System():
     ''' A base object for any computer system, be it SoC, desktop, whatever.
 
@@ -159,7 +270,7 @@ class System():
         '''
         self.running = False
 
-    def declare_linked_pin(self, terminal, mode):
+    def declare_linked_pin(self, terminal, mode, name=None):
         ''' Sets up the terminal for on_start initialization and returns a 
         pin object.
         '''
@@ -180,7 +291,15 @@ class System():
         # Return the declared pin. If a system uses a mmap, it'll be handled 
         # in the child declare_linked_pin method
         return Pin(terminal, mode, 
-            methods=self._resolve_mode(self, terminal, mode)())
+            methods=self._resolve_mode(self, terminal, mode)(), name=name)
+
+    def start_pins(self, pins):
+        ''' Starts the device's pins, once the system itself has started. 
+        Systems can override this to start several pins together (for 
+        example, with one register write for a whole bank of them).
+        '''
+        for pin in pins:
+            pin.on_start()
 
     def release_terminal(self, terminal):
         ''' Releases a terminal, allowing re-declaration. Note: the device 
@@ -205,6 +324,13 @@ class System():
         # I don't think the terminals_available bit was ever modified?
         # self.terminals_available[terminal] = True
 
+    def declare_linked_group(self, pins, *args, **kwargs):
+        ''' Creates a Plug that operates on several already-declared pins at
+        once. Must be defined for each individual SoC.
+        '''
+        raise NotImplementedError('declare_linked_group must be defined for '
+            'each individual SoC.')
+
     def mutate_terminal(self, *args, **kwargs):
         ''' Changes a terminal's function while the device it's attached to is 
         running. May or may not be overridden for each individual SoC. Only 
@@ -234,6 +360,8 @@ class Device():
     system          object      core.system, subclass, etc
     _resolve_header callable    resolves a pin into a header   
     create_pin      callable    connects a header pin to a specific term mode
+    groups          list        [core.Plug object, ...] from create_group
+    _register_pins  dict        [register name] = [core.Pin, ...] declared
 
     create_pin()
     =========================================================================
@@ -251,12 +379,71 @@ class Device():
     ----------------------------------------------------------------
 
     name=None       str         'friendly name for the pin'
+
+    create_group()
+    =========================================================================
+
+    Bundles several already-created pins into a single Plug object that can
+    update all of them at once. The group is started and stopped along with
+    the device.
+
+    *args
+    ----------------------------------------------------------------
+
+    pins            iterable    ['pin number or name', ...]
+
+    **kwargs
+    ----------------------------------------------------------------
+
+    name=None       str         'friendly name for the group'
+
+    configure()
+    =========================================================================
+
+    Creates and configures a whole pinout at once. Everything is checked 
+    before any pin is declared, and if anything fails along the way, the 
+    pins created so far are released again, so it's all or nothing. Pins are
+    declared bank by bank (well, register by register).
+
+        bbb.configure({'8_7': {'mode': 'gpio', 'name': 'led', 
+                               'direction': 'out'},
+                       '8_8': 'gpio'})
+
+    *args
+    ----------------------------------------------------------------
+
+    spec            dict        {'pin number': 'mode', ...} or
+                                {'pin number': {'mode': 'mode', 
+                                    'name': 'friendly name', 
+                                    **config kwargs}, ...}
+                                optionally wrapped as {'pins': {...}}
+                    str         path to a .json or .toml file of the same
+
+    return
+    ----------------------------------------------------------------
+
+    dict            {'pin number': core.Pin, ...} in spec order
+
+    find_pin(), find_gpio(), pins_for(), pins_on()
+    =========================================================================
+
+    Reverse lookups, all answered from indexes built in advance:
+
+    find_pin(terminal)          'pin number' for an SoC terminal, or None
+    find_gpio(bank, channel)    'pin number' for a gpio channel, or None
+    pins_for(mode_type)         ('pin number', ...) of every header pin 
+                                whose terminal offers the mode, once each
+    pins_on(register)           (core.Pin, ...) of every declared pin that
+                                uses the register, ex 'gpio1'
     '''
     def __init__(self, system, resolve_header):
 
         self._resolve_header = resolve_header
         self.system = system
         self.pinout = {}
+        self.groups = []
+        # Declared pins, indexed by register
+        self._register_pins = {}
         self.pins_available = self._resolve_header.list_system_headers()
         self.running = False
 
@@ -273,9 +460,16 @@ class Device():
         # MUST call system on_start before pin on_start
         self.system.on_start()
 
-        # Now start every pin
-        for pin in self.pinout.values():
-            pin.on_start()
+        # Now start every pin. The system gets them all at once, so it can
+        # plan ahead.
+        pins = self._pins()
+        self.system.start_pins(pins)
+        for pin in pins:
+            pin.bind_fast_methods()
+
+        # Groups operate on started pins, so they go last
+        for group in self.groups:
+            group.on_start()
 
     def __exit__(self, type, value, traceback):
         self.on_stop()
@@ -284,14 +478,25 @@ class Device():
         # This is separated out so that there is a stop method that doesn't
         # return, which is useful for subclassing
 
+        # Groups go first, since they rely upon their pins
+        for group in self.groups:
+            group.on_stop()
+
         # MUST call pin on_stop before system on_stop
-        for pin in self.pinout.values():
+        for pin in self._pins():
+            pin.unbind_fast_methods()
             pin.on_stop()
 
         self.system.on_stop()
 
         self.running = False
 
+    def _pins(self):
+        ''' Returns [core.Pin, ...] of every declared pin, once each (named
+        pins are in the pinout twice).
+        '''
+        return list(dict.fromkeys(self.pinout.values()))
+
     def create_pin(self, pin_num, mode, name=None, **kwargs):
         # Need lots of error traps first
         # Check for existing pin at pin_num (note that this is a little 
@@ -304,6 +509,11 @@ class Device():
             raise ValueError('Choose a unique pin name.')
 
         terminal = self._resolve_header(pin_num)
+        return self._add_pin(pin_num, terminal, mode, name)
+
+    def _add_pin(self, pin_num, terminal, mode, name):
+        ''' Declares an already-checked pin and files it away.
+        '''
         pin = self.system.declare_linked_pin(terminal, mode, name=name)
         pin.num = pin_num
 
@@ -314,6 +524,113 @@ class Device():
         if name:
             self.pinout[pin.name] = pin
         self.pinout[pin_num] = pin
+        self._register_pins.setdefault(pin.register_name, []).append(pin)
+        return pin
+
+    def configure(self, spec):
+        # Error traps
+        if self.running:
+            raise RuntimeError('Cannot configure pins while running.')
+        if not isinstance(spec, dict):
+            spec = _load_spec(spec)
+        pins = spec.get('pins', spec)
+
+        # Check everything first, and work out each pin's register
+        # --------------
+        plan = []
+        terminals = set()
+        names = set()
+        for pin_num, entry in pins.items():
+            if isinstance(entry, str):
+                entry = {'mode': entry}
+            else:
+                # Whatever's left over after mode and name goes to config
+                entry = dict(entry)
+            if 'mode' not in entry:
+                raise ValueError('No mode given for pin ' + pin_num + '.')
+            mode = entry.pop('mode')
+            name = entry.pop('name', None)
+
+            if pin_num in self.pinout:
+                raise ValueError('Pin ' + pin_num + ' has already been '
+                    'assigned.')
+            if name and (name in self.pinout or name in names or 
+                    name in pins):
+                raise ValueError('Choose a unique pin name.')
+            try:
+                terminal = self._resolve_header(pin_num)
+            except KeyError:
+                raise ValueError('Pin ' + pin_num + ' does not exist.')
+            if terminal in terminals or \
+                    terminal in self.system.terminals_declared:
+                raise ValueError('Pin ' + pin_num + ' uses a terminal that '
+                    'has already been assigned.')
+            # This also traps bad terminals (ex GND) and unavailable modes
+            register = self.system._resolve_mode.get_register(terminal, mode)
+
+            terminals.add(terminal)
+            if name:
+                names.add(name)
+            plan.append((str(register), pin_num, terminal, mode, name, 
+                entry))
+
+        # Now declare them, one register at a time
+        # --------------
+        plan.sort(key=lambda step: step[0])
+        created = {}
+        try:
+            for register, pin_num, terminal, mode, name, config in plan:
+                pin = self._add_pin(pin_num, terminal, mode, name)
+                created[pin_num] = pin
+                if config:
+                    pin.config(**config)
+        # Don't leave a half-configured pinout behind
+        except:
+            for pin_num in created:
+                self.release_pin(pin_num)
+            raise
+
+        return {pin_num: created[pin_num] for pin_num in pins}
+
+    def create_group(self, pins, name=None):
+        ''' Creates a group from pins that have already been created. Pins 
+        may be called by friendly name or pin number, and the group keeps the
+        order they were passed in.
+        '''
+        # Error traps
+        if self.running:
+            raise RuntimeError('Cannot create a group while running.')
+        pins = [self.pinout[pin] for pin in pins]
+        if not pins:
+            raise ValueError('A group needs at least one pin.')
+
+        group = self.system.declare_linked_group(pins)
+        group.name = name
+        self.groups.append(group)
+
+        return group
+
+    def find_pin(self, terminal):
+        return self._resolve_header.find_pin(terminal)
+
+    def find_gpio(self, bank, channel):
+        terminal = self.system._resolve_mode.find_gpio(bank, channel)
+        if terminal is None:
+            return None
+        return self.find_pin(terminal)
+
+    def pins_for(self, mode_type):
+        pins = []
+        for terminal in self.system._resolve_mode.terminals_for(mode_type):
+            pin_num = self.find_pin(terminal)
+            if pin_num is not None:
+                pins.append(pin_num)
+        # Some header pins are wired to two terminals (ex 9_41, 9_42), so 
+        # they'd otherwise show up twice
+        return tuple(dict.fromkeys(pins))
+
+    def pins_on(self, register):
+        return tuple(self._register_pins.get(register, ()))
 
     def release_pin(self, pin):
         ''' Releases the called pin. Can be called by friendly name or pin
@@ -322,10 +639,25 @@ class Device():
 
         # Get relevant information from the pin before deleting it
         pin = self.pinout[pin]
+
+        # Error trap: groups keep their own masks, so they'd still drive it
+        for index, group in enumerate(self.groups):
+            if pin in group.pins.values():
+                group_name = group.name
+                if group_name is None:
+                    group_name = str(index)
+                raise ValueError('Pin ' + str(pin.num or pin.terminal) +
+                    ' is in group ' + group_name + ' and cannot be released.')
+
         name = pin.name
         num = pin.num
         terminal = pin.terminal
 
+        register_pins = self._register_pins[pin.register_name]
+        register_pins.remove(pin)
+        if not register_pins:
+            del self._register_pins[pin.register_name]
+
         # Remove all associated keys in the pinout
         if name:
             try:
@@ -0,0 +1,188 @@
+''' A cache of compiled hardware maps. Parsing the JSON maps (and walking
+them into all of the derived lookup dicts) dominates the cost of creating a
+device, which short-lived processes pay every single time. Instead, whatever
+a map's builder derives from the JSON is stored with marshal the first time,
+and loaded straight from there afterwards.
+
+Cache entries are named after a hash of the source JSON (plus the builder's
+code and the python version), so an edited map, a changed builder, or a
+different interpreter never picks up a stale entry; it just builds a new
+one. hwiopy usually runs as root (for /dev/mem), and unmarshalling is only
+as safe as the file, so an entry is only ever loaded if it belongs to the 
+current user, isn't writable by anybody else, and its contents match the 
+digest stored in front of them. Anything else is ignored and rebuilt. The
+cache lives in $HWIOPY_CACHE_DIR, or $XDG_CACHE_HOME/hwiopy, or 
+~/.cache/hwiopy. Set HWIOPY_CACHE_DIR to an empty string to turn it off. If
+the cache can't be written, everything still works, just without the 
+speedup.
+
+On top of that, shared() hands out a single, process-wide instance of each
+(read-only) map object, so that every device after the first gets its maps
+for free.
+
+LICENSING
+-------------------------------------------------
+
+hwiopy: A common API for hardware input/output access.
+    Copyright (C) 2014-2015 Nicholas Badger
+    badg@nickbadger.com
+    nickbadger.com
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+    USA
+
+------------------------------------------------------
+'''
+
+# Global dependencies
+import os
+import sys
+import marshal
+import hashlib
+
+# Bump this whenever the layout of the cache files changes
+_cache_format = 2
+# Every cache file starts with the digest of the (marshalled) rest of it
+_digest_size = hashlib.sha256().digest_size
+
+# {(map class, *args): instance} for shared()
+_shared = {}
+
+def cache_dir():
+    ''' Returns the directory for compiled maps, or None if the cache is
+    turned off.
+    '''
+    directory = os.environ.get('HWIOPY_CACHE_DIR')
+    if directory is not None:
+        return directory or None
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'hwiopy')
+
+def read_resource(resource):
+    ''' Returns the bytes of a file shipped with hwiopy, ex 
+    'maps/bbb_sysmap.json'. Uses importlib.resources, which (unlike 
+    pkg_resources) is cheap to import. Cheaper still not to, until a map is 
+    actually needed.
+    '''
+    from importlib.resources import files
+    return files('hwiopy').joinpath(resource).read_bytes()
+
+def _build(raw, build):
+    # Once everything is cached, json is never needed
+    import json
+    return build(json.loads(raw.decode('utf-8')))
+
+def shared(cls, *args):
+    ''' Returns the process-wide instance of the map class, creating it the
+    first time. Only for map objects that are never modified after creation.
+    '''
+    key = (cls,) + args
+    instance = _shared.get(key)
+    if instance is None:
+        # If two threads race here, they both build it, but only one wins
+        instance = _shared.setdefault(key, cls(*args))
+    return instance
+
+def _trusted(stat):
+    ''' Is the (os.stat) cache file ours, and only writable by us? Anybody 
+    else who can write it could make us unmarshal whatever they like.
+    '''
+    # No such thing as file ownership (that python knows of) on windows
+    if not hasattr(os, 'geteuid'):
+        return True
+    return stat.st_uid == os.geteuid() and not stat.st_mode & 0o022
+
+def load_map(resource, build, version=1, overrides=None):
+    ''' Returns build(parsed JSON) for the hwiopy resource, from the cache if
+    possible.
+
+    load_map():
+    ======================================================
+
+    *args
+    ------------------------------------------------------
+
+    resource            str             'maps/something.json'
+    build               callable        build(dict) -> marshallable object
+    version=1           int             Bump whenever build's output changes
+                                        without build's code changing
+    overrides=None      dict            {'key': value, ...} to add to (or 
+                                        replace in) the top level of the 
+                                        JSON. Never cached.
+
+    return
+    ------------------------------------------------------
+
+    object              Whatever build returns. Note that marshal only
+                        handles builtin types (dicts, lists, tuples, strs,
+                        ints...), but those come back exactly as they were.
+    '''
+    raw = read_resource(resource)
+    # Copy-on-write: the shipped map is copied (at the top level only) and
+    # the overrides are applied to the copy
+    if overrides:
+        import json
+        map_dict = json.loads(raw.decode('utf-8'))
+        map_dict.update(overrides)
+        return build(map_dict)
+
+    directory = cache_dir()
+    if not directory:
+        return _build(raw, build)
+
+    # Everything that could change the result goes into the hash, including
+    # the builder's own code, so that editing it is enough to invalidate
+    digest = hashlib.sha1(raw)
+    digest.update(repr((_cache_format, build.__module__, build.__qualname__,
+        version, sys.version_info[:2], marshal.version)).encode('utf-8'))
+    digest.update(marshal.dumps(build.__code__))
+    path = os.path.join(directory, os.path.basename(resource) + '.' +
+        digest.hexdigest() + '.marshal')
+
+    try:
+        # Note that marshal.loads on the whole file is much faster than 
+        # marshal.load on the file object
+        with open(path, 'rb') as f:
+            if _trusted(os.fstat(f.fileno())):
+                data = f.read()
+                payload = data[_digest_size:]
+                if hashlib.sha256(payload).digest() == data[:_digest_size]:
+                    return marshal.loads(payload)
+    # Not there (or garbage). Either way, build it from scratch.
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    result = _build(raw, build)
+    try:
+        # Only needed the first time round, and not exactly quick to import
+        import tempfile
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Write to a temporary file first and then rename, so that nobody
+        # (another process, say) ever loads a half-written file
+        handle, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            payload = marshal.dumps(result)
+            with os.fdopen(handle, 'wb') as f:
+                f.write(hashlib.sha256(payload).digest())
+                f.write(payload)
+            os.replace(temp_path, path)
+        except:
+            os.unlink(temp_path)
+            raise
+    # A read-only home directory or whatnot shouldn't stop anything
+    except OSError:
+        pass
+    return result
@@ -31,9 +31,8 @@ Something something sooooomething goes here.
 import io
 import struct
 import mmap
-import json
 from warnings import warn
-from pkg_resources import resource_string
+from types import MappingProxyType
 # from os import listdir
 # from os.path import isfile, join, split
 
@@ -41,10 +40,38 @@ from pkg_resources import resource_string
 from . import __path__
 from .. import core
 from .. import systems
+from ..core.mapcache import load_map, shared
 
 # from . import generic
 # from .generic import device
 
+def _compile_header_map(sys_map):
+    # Everything _header_map derives from the json, for load_map to cache
+    hardwired = {}
+    connected = {}
+    all_headers = {}
+    # Separate any hardwired (5VDC, GND, etc) pins from SoC connections
+    # Need way to collapse dict list into single item for _all_headers
+    for pin_num, pin_dict in sys_map.items():
+        if pin_dict['connections']:
+            hardwired[pin_num] = tuple(pin_dict['connections'])
+            all_headers[pin_num] = tuple(pin_dict['connections'])
+        elif pin_dict['terminals']:
+            connected[pin_num] = tuple(pin_dict['terminals'])
+            all_headers[pin_num] = tuple(pin_dict['terminals'])
+    # Reverse index: which header pin is a terminal on? Note that 9_41 and 
+    # 9_42 each have two terminals, but every terminal has one pin at most.
+    terminal_pins = {}
+    for pin_num, terminals in connected.items():
+        for terminal in terminals:
+            terminal_pins[terminal] = pin_num
+    return {'sys_map': sys_map, 
+        'header_pins': tuple(sys_map.keys()),
+        'terminal_pins': terminal_pins,
+        'hardwired': hardwired,
+        'connected': connected,
+        'all_headers': all_headers}
+
 class _header_map():
     ''' Callable class that resolves the header pins into their connections, 
     as well as providing several utility functions to describe the device.
@@ -53,7 +80,8 @@ class _header_map():
     ======================================================
 
     Returns the header connection, be it a hardwired one (ex 5VDC) or a SoC
-    terminal.
+    terminal. Instances are read-only, and shared process-wide unless 
+    created with overrides, ex _header_map({'8_7': {...}}).
 
     *args
     ------------------------------------------------------
@@ -87,27 +115,30 @@ class _header_map():
     -------------------------------------------------------
 
     str                 'description of register'
+
+    _header_map.find_pin():
+    =========================================================
+
+    *args
+    ---------------------------------------------------------
+
+    terminal:           str             'name of SoC terminal'
+
+    return
+    -------------------------------------------------------
+
+    str                 'pin num', or None if it isn't on a header
     '''
-    def __init__(self):
-        # Load the corresponding json file and create a map dict
-        self._sys_map = json.loads(
-            resource_string('hwiopy', 'maps/bbb_sysmap.json').\
-            decode('utf-8'))
-        self._header_pins = tuple(self._sys_map.keys())
-
-        # Predeclare 
-        self._hardwired = {}
-        self._connected = {}
-        self._all_headers = {}
-        # Separate any hardwired (5VDC, GND, etc) pins from SoC connections
-        # Need way to collapse dict list into single item for _all_headers
-        for pin_num, pin_dict in self._sys_map.items():
-            if pin_dict['connections']:
-                self._hardwired[pin_num] = pin_dict['connections']
-                self._all_headers[pin_num] = pin_dict['connections']
-            elif pin_dict['terminals']:
-                self._connected[pin_num] = pin_dict['terminals']
-                self._all_headers[pin_num] = pin_dict['terminals']
+    def __init__(self, overrides=None):
+        # Load the corresponding (compiled) json file
+        compiled = load_map('maps/bbb_sysmap.json', _compile_header_map,
+            overrides=overrides)
+        self._sys_map = MappingProxyType(compiled['sys_map'])
+        self._header_pins = compiled['header_pins']
+        self._hardwired = MappingProxyType(compiled['hardwired'])
+        self._connected = MappingProxyType(compiled['connected'])
+        self._all_headers = MappingProxyType(compiled['all_headers'])
+        self._terminal_pins = MappingProxyType(compiled['terminal_pins'])
 
     def __call__(self, pin_num, pin_941=None, pin_942=None, *args, **kwargs):
         # Grab the start and convert it to int (aka long)
@@ -144,20 +175,42 @@ class _header_map():
     def list_all_headers(self):
         return self._all_headers
 
+    def find_pin(self, terminal):
+        return self._terminal_pins.get(terminal)
+
 
 class BBB(core.Device):
     ''' A beaglebone black. Must have kernel version >=3.8, use overlays, etc.
+
+    BBB():
+    ======================================================
+
+    The hardware maps are shared by every BBB in the process, so creating 
+    more than one is cheap. To use modified maps, pass overrides for their
+    top level entries; only the maps you override get copied.
+
+    *args
+    ------------------------------------------------------
+
+    mem_filename='/dev/mem' str         Memory file, or a stand-in
+    sys_map=None        dict            {'header pin': {...}, ...}
+    **system_maps                       Passed to systems.Sitara335
     '''
     # Where is the memory mapping stored to?
     # mem_reg_loc = '/dev/mem'
     # What pins correspond to what possible mappings?
     
 
-    def __init__(self, mem_filename='/dev/mem'): 
+    def __init__(self, mem_filename='/dev/mem', sys_map=None, **system_maps): 
         ''' Creates the device and begins setting it up.
         '''
+        if sys_map:
+            header_map = _header_map(sys_map)
+        else:
+            header_map = shared(_header_map)
         # Call super, initializing all of the abstract base class attributes
-        super().__init__(systems.Sitara335(mem_filename), _header_map())
+        super().__init__(systems.Sitara335(mem_filename, **system_maps), 
+            header_map)
 
     def create_pin(self, pin_num, mode, name=None):
         ''' Gets a pin object from the self.chipset object and connects it to 
@@ -29,24 +29,232 @@ Something something sooooomething goes here.
 
 Missing a great many error traps.
 
-This should all be made threadsafe. It is currently HIGHLY un-threadsafe.
+Concurrency model
+-------------------------------------------------
+
+Starting and stopping (and declaring pins, configuring them before starting,
+and so on) must happen from one thread. Once the system is running, pins and
+groups may be used from as many threads as you like:
+
++ Output goes through the setdataout and cleardataout registers, which the 
+  hardware applies atomically, one whole word at a time. Those writes are 
+  therefore lock-free (and so is reading datain).
++ Anything that has to read, modify, and write back a shared register (the 
+  gpio oe, the detect registers, the clock control) holds that register 
+  block's lock for the duration. The locks are striped across register 
+  blocks by address (the same way every run), so different banks don't 
+  contend with each other. Unrelated blocks can share a stripe, so stripe
+  locks are only ever held for a single read-modify-write: never nest them
+  (the second one may be the same lock), and never hold one across 
+  anything long. The peripherals that need holding for longer (SPI, UART,
+  I2C, and ADC transfers) have locks of their own.
++ The register mmaps are handed out under a lock, and are only released 
+  when stopping.
++ The asyncio edge poller belongs to the thread running the event loop.
++ A UART's ring buffer has its own lock, shared with its background drain
+  thread (if it has one), which is stopped along with the system.
+
+Nothing here relies on the GIL, so the same holds on free-threaded builds.
 '''
 # Global dependencies
 import io
-import json
+import sys
 import struct
 import mmap
-from pkg_resources import resource_string
-from math import ceil
+import time
+import threading
+from types import MappingProxyType
+from collections import namedtuple, deque
+from array import array
+from functools import partial
+from itertools import repeat
 
 # Intrapackage dependencies
 from . import __path__
 from .. import core
+from ..core.mapcache import load_map, shared
 # from .. import platforms
 
+# Note that asyncio and statistics are slow to import, and only needed by a 
+# few methods, so those import them themselves.
+
 # This dict gets updated each time a new mode generator is implemented.
 _mode_generators = {}
 
+# Registers are accessed as whole 32-bit words through memoryview casts. Note
+# that the format is native-endian, which, on the (little-endian) cortex A8 is
+# exactly what the hardware wants.
+_word_format = 'I'
+_word_size = struct.calcsize(_word_format)
+# A few blocks (the epwms, mostly) have 16-bit registers, which get the same
+# treatment, just with halfwords.
+_halfword_format = 'H'
+_halfword_size = struct.calcsize(_halfword_format)
+
+# mmaps have to start on a page boundary and are sized in whole pages anyways
+_page_size = mmap.PAGESIZE
+
+# How many locks guard read-modify-writes of the register blocks. Blocks are
+# spread over these by address, so collisions are harmless (just contention).
+_lock_stripe_bits = 4
+_lock_stripes = 1 << _lock_stripe_bits
+
+def _as_words(samples):
+    ''' Returns samples as something indexable by 32-bit word: a cast 
+    memoryview if samples is a contiguous buffer of bytes or 32-bit ints 
+    (array('I'), bytes, a uint32 numpy array...), or else a new array.
+    Byte buffers are taken as raw words, so they need to be a whole number
+    of them (or ValueError).
+    '''
+    try:
+        view = memoryview(samples)
+    except TypeError:
+        # Lists, generators, etc
+        return array(_word_format, samples)
+
+    if view.itemsize == 1:
+        # Falling back to one word per byte would silently be the wrong data
+        if view.nbytes % _word_size:
+            raise ValueError('Byte buffers must hold a whole number of '
+                '32-bit words.')
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        return view.cast('B').cast(_word_format)
+    if view.itemsize == _word_size and \
+            view.format.lstrip('@=') in ('I', 'i', 'L', 'l'):
+        try:
+            return view.cast('B').cast(_word_format)
+        # Non-contiguous
+        except TypeError:
+            pass
+    # Wider (or strided) integers, ex numpy int64: one word per item
+    return array(_word_format, view.tolist())
+
+def _mask_words(words, mask, invert=False, shift=0):
+    ''' Returns array('I') of (word & mask) for every word in words, or of
+    (~word & mask) if invert, and then shifted right by shift bits. Rather 
+    than looping in python, this does it all at once by treating the whole 
+    buffer as a single (big) int.
+    '''
+    count = len(words)
+    if not count:
+        return array(_word_format)
+    values = int.from_bytes(words, sys.byteorder)
+    pattern = int.from_bytes(array(_word_format, [mask]) * count, 
+        sys.byteorder)
+    if invert:
+        values ^= pattern
+    # Since everything outside the mask is zeroed, nothing can shift across
+    # a word boundary
+    values = (values & pattern) >> shift
+    result = array(_word_format)
+    result.frombytes(values.to_bytes(count * _word_size, sys.byteorder))
+    return result
+
+# Integer-resolved descriptors for the register maps. Like the map objects that
+# hold them, these are shared by every system and pin, so they're immutable.
+# Memory block of a register: [start, end] addresses (end inclusive), size
+_block = namedtuple('_block', 'start end size')
+# One function of a register: byte offset and word index into the register 
+# block, size in bits, byte_slice for the raw mmap, and the bit fields
+# ({name: _bit_field}) from 'bits', and from 'functions', if it has those.
+_register_field = namedtuple('_register_field', 
+    'offset bitsize index byte_slice bits functions')
+# A range of bits within a register: the bit numbers, the mask of all of 
+# them, the shift of the lowest one, and any named values (already shifted)
+_bit_field = namedtuple('_bit_field', 'bits mask shift values')
+
+def _make_bit_field(bits, values=None):
+    bits = tuple(bits)
+    mask = 0
+    for bit in bits:
+        mask |= 1 << bit
+    shifted = {}
+    for name, value in (values or {}).items():
+        shifted[name] = int(value, base=16) << bits[0]
+    return _bit_field(bits, mask, bits[0], MappingProxyType(shifted))
+
+def _make_register_field(function_dict):
+    offset = int(function_dict['offset'], base=16)
+    bitsize = function_dict['bitsize']
+    # Note that [low, high] in the json is inclusive
+    bits = {}
+    for command, (low, high) in function_dict.get('bits', {}).items():
+        bits[command] = _make_bit_field(range(low, high + 1))
+    functions = {}
+    for name, function in function_dict.get('functions', {}).items():
+        values = dict(function)
+        functions[name] = _make_bit_field(values.pop('__bits__'), values)
+    # Not every function is a whole, aligned word (some are placeholders). 
+    # Those have no index, since unaligned access would split into sub-word 
+    # bus accesses.
+    if offset % _word_size:
+        index = None
+    else:
+        index = offset // _word_size
+    return _register_field(offset, bitsize, index, 
+        slice(offset, offset + bitsize // 8), MappingProxyType(bits), 
+        MappingProxyType(functions))
+
+# Everything the map classes derive from the JSON maps is built by these, so
+# that it can be cached by load_map.
+def _compile_memory_map(map_dict):
+    addresses = {}
+    for register, register_dict in map_dict.items():
+        # Note that end is inclusive
+        addresses[register] = (int(register_dict['start'], base=16), 
+            int(register_dict['end'], base=16))
+    return {'map_dict': map_dict, 
+        'registers': tuple(map_dict.keys()), 
+        'addresses': addresses}
+
+def _compile_register_map(register_dict):
+    register_functions = {}
+    resolved = {}
+    for reg, reg_dict in register_dict.items():
+        register_functions[reg] = tuple(reg_dict.keys())
+        # (offset, bitsize) for every function
+        resolved[reg] = {}
+        for reg_fn, function_dict in reg_dict.items():
+            resolved[reg][reg_fn] = (int(function_dict['offset'], base=16),
+                function_dict['bitsize'])
+    return {'register_dict': register_dict, 
+        'register_types': tuple(register_dict.keys()),
+        'register_functions': register_functions,
+        'resolved': resolved}
+
+def _compile_mode_map(terminal_dict):
+    # A reference dict with all of the terminals: modes
+    terminals = {}
+    for term, term_dict in terminal_dict.items():
+        terminals[term] = tuple(term_dict['modes'].keys())
+
+    # A reference dict of only assignable modes
+    assignable = {}
+    for term, term_dict in terminal_dict.items():
+        # Validate that the mode has a number, therefore make it assignable
+        assignable[term] = tuple(mode for mode, mode_dict in 
+            term_dict['modes'].items() if mode_dict['mode_num'])
+
+    # Reverse indexes: which terminals offer a mode type, and which terminal
+    # is which gpio (bank, channel)
+    mode_terminals = {}
+    gpio_channels = {}
+    for term, term_dict in terminal_dict.items():
+        for mode, mode_dict in term_dict['modes'].items():
+            mode_terminals.setdefault(mode_dict['mode_type'], []).append(term)
+            if mode_dict['mode_type'] == 'gpio':
+                gpio_channels[(mode_dict['register'], 
+                    int(mode_dict['register_detail']))] = term
+    for mode_type, terms in mode_terminals.items():
+        mode_terminals[mode_type] = tuple(terms)
+
+    return {'mode_dict': terminal_dict, 
+        'terminals': terminals, 
+        'assignable': assignable,
+        'mode_terminals': mode_terminals,
+        'gpio_channels': gpio_channels}
+
 # Convert dicts into functions for memory maps and registers
 class _memory_map():
     ''' Callable class that resolves the memory mapping for registers into a 
@@ -56,6 +264,12 @@ class _memory_map():
     _memory_map():
     ======================================================
 
+    Instances are read-only, and shared process-wide unless created with 
+    overrides (see mapcache.shared).
+
+    _memory_map(overrides=None):
+        overrides       dict            {'register': {'start': ...}, ...}
+
     *args
     ------------------------------------------------------
 
@@ -67,6 +281,21 @@ class _memory_map():
     tuple               (start address, end address)
 
 
+    _memory_map.block():
+    ========================================================
+
+    The (shared, immutable) descriptor for the register's memory.
+
+    *args
+    ---------------------------------------------------------
+
+    register:           str             'name of register'
+
+    return
+    --------------------------------------------------------
+
+    namedtuple          _block(start, end, size)
+
     _memory_map.list():
     ========================================================
 
@@ -88,20 +317,25 @@ class _memory_map():
 
     str                 'description of register'
     '''
-    def __init__(self):
-        # Load the corresponding json file and create a map dict
-        self._map_dict = json.loads(
-            resource_string('hwiopy', 'maps/cortexA8_memmap.json').\
-            decode('utf-8'))
-        self._registers = tuple(self._map_dict.keys())
+    def __init__(self, overrides=None):
+        # Load the corresponding (compiled) json file
+        compiled = load_map('maps/cortexA8_memmap.json', _compile_memory_map,
+            overrides=overrides)
+        self._map_dict = MappingProxyType(compiled['map_dict'])
+        self._registers = compiled['registers']
+        # The (start, end) tuples, already converted to int
+        self._addresses = MappingProxyType(compiled['addresses'])
+
+        blocks = {}
+        for register, (start, end) in self._addresses.items():
+            blocks[register] = _block(start, end, end + 1 - start)
+        self._blocks = MappingProxyType(blocks)
         
     def __call__(self, register):
-        # Grab the start and convert it to int (aka long)
-        start = int(self._map_dict[register]['start'], base=16)
-        # Grab the end and same
-        end = int(self._map_dict[register]['end'], base=16)
-        # Return the tuple
-        return (start, end)
+        return self._addresses[register]
+
+    def block(self, register):
+        return self._blocks[register]
 
     def get_clockcontrol(self, register):
         # Get the corresponding control register
@@ -111,6 +345,12 @@ class _memory_map():
         except KeyError:
             return None
 
+    def get_clockcontrol_name(self, register):
+        # The register's entry in its clock control block. Usually that's 
+        # named after the register itself (gpio2 -> cm_per gpio2), but not
+        # always (epwm1 -> cm_per epwmss1).
+        return self._map_dict[register].get('clock_control_name', register)
+
     # Very simply return the available registers
     def list(self):
         return self._registers
@@ -127,6 +367,12 @@ class _register_map():
     _register_map():
     ======================================================
 
+    Instances are read-only, and shared process-wide unless created with 
+    overrides (see mapcache.shared).
+
+    _register_map(overrides=None):
+        overrides       dict            {'register type': {...}, ...}
+
     *args
     ------------------------------------------------------
 
@@ -140,9 +386,26 @@ class _register_map():
     register_function=None: dict            {'function': (offset, bitsize)...}
     register_function=str:
         bit_command=None:   tuple           (offset, bitsize)
-        bit_command=str:    tuple           (offset, bitsize, bitrange)
+        bit_command=str:    tuple           (offset, bitsize, (bit, ...))
 
 
+    _register_map.table():
+    ========================================================
+
+    The (shared, immutable) descriptors for every function of the register
+    type. Use these instead of calling for the whole register type, which 
+    has to make a fresh dict every time.
+
+    *args
+    ---------------------------------------------------------
+
+    register_type:      str             'ex: gpio, pwm, etc'
+
+    return
+    --------------------------------------------------------
+
+    mapping             {'function': _register_field, ...}
+
     _register_map.list():
     ========================================================
 
@@ -173,15 +436,23 @@ class _register_map():
     # What string defines the command for "each bit is a channel"?
     _channelwise = '_intchannel'
 
-    def __init__(self):
-        # Load the corresponding json file and create a map dict
-        self._register_dict = json.loads(
-            resource_string('hwiopy', 'maps/cortexA8_registers.json').\
-            decode('utf-8'))
-        self._register_types = tuple(self._register_dict.keys())
-        self._register_functions = {}
+    def __init__(self, overrides=None):
+        # Load the corresponding (compiled) json file
+        compiled = load_map('maps/cortexA8_registers.json', 
+            _compile_register_map, overrides=overrides)
+        self._register_dict = MappingProxyType(compiled['register_dict'])
+        self._register_types = compiled['register_types']
+        self._register_functions = \
+            MappingProxyType(compiled['register_functions'])
+        # {type: {function: (offset, bitsize)}}, already converted to int
+        self._resolved = MappingProxyType(compiled['resolved'])
+
+        tables = {}
         for reg, reg_dict in self._register_dict.items():
-            self._register_functions[reg] = tuple(reg_dict.keys())
+            tables[reg] = MappingProxyType({reg_fn: 
+                _make_register_field(function_dict) for 
+                reg_fn, function_dict in reg_dict.items()})
+        self._tables = MappingProxyType(tables)
 
     def __call__(self, register_type, register_function=None, 
             bit_command=None):
@@ -189,43 +460,23 @@ class _register_map():
         if bit_command and not register_function:
             raise ValueError('Must select function to resolve bit command.')
 
-        if not register_function:
-            reg_fns = self.list(register_type)
-        else:
-            reg_fns = [register_function]
-
-        tmp_dict = {}
-        for reg_fn in reg_fns:
-            # Grab the function's definition
-            # Then resolve the offset and size for the register function
-            function_dict = \
-                self._register_dict[register_type][reg_fn]
-            # Return a tuple of (offset, bitsize)
-            resolved = [int(function_dict['offset'], base=16), 
-                function_dict['bitsize']]
-
-            # If we're trying to call a specific bit command, resolve which 
-            # bits correspond to that setting. Note that due to error trap, 
-            # this will only be true if we're focusing on a specific function
-            if bit_command:
-                # Grab the dictionary of possible bits for this function
-                bit_range_dict = self.\
-                    _register_dict[register_type][reg_fn]['bits']
-                # Extract the bits as a list and return it
-                bit_range = list(range(
-                    bit_range_dict[bit_command][0], 
-                    bit_range_dict[bit_command][1] + 1
-                    ))
-                resolved.append(bit_range)
-
-            tmp_dict[reg_fn] = tuple(resolved)
-
         # If we are, in fact, only concerned with a single function, strip the
-        # dict down to the tuple
+        # dict down to the tuple. Otherwise hand out a copy, since it's the
+        # caller's to mess with.
         if not register_function:
-            return tmp_dict
-        else: 
-            return tmp_dict[register_function]
+            return dict(self._resolved[register_type])
+        resolved = self._resolved[register_type][register_function]
+
+        # If we're trying to call a specific bit command, add which bits
+        # correspond to that setting.
+        if bit_command:
+            field = self._tables[register_type][register_function]
+            resolved += (field.bits[bit_command].bits,)
+
+        return resolved
+
+    def table(self, register_type):
+        return self._tables[register_type]
 
     # Return the available register types, or if a type is specified, the 
     # functions available within that register.
@@ -250,6 +501,13 @@ class _mode_map():
     _mode_map():
     ======================================================
 
+    Instances are read-only, and shared process-wide unless created with 
+    overrides (see mapcache.shared).
+
+    _mode_map(modes_file, overrides=None):
+        modes_file      str             'maps/something.json'
+        overrides       dict            {'terminal': {'modes': ...}, ...}
+
     *args
     ------------------------------------------------------
 
@@ -274,8 +532,8 @@ class _mode_map():
     return
     --------------------------------------------------------
 
-    terminal=None       dict            {'term': ['mode', ...], ...}
-    terminal=str        list            ['mode', 'mode', ...]
+    terminal=None       mapping         {'term': ('mode', ...), ...}
+    terminal=str        tuple           ('mode', 'mode', ...)
 
     _mode_map.describe():
     ========================================================
@@ -305,44 +563,51 @@ class _mode_map():
     --------------------------------------------------------
 
     str                 'name of register'
+
+    _mode_map.terminals_for():
+    ========================================================
+
+    *args
+    --------------------------------------------------------
+
+    mode_type           str             'ex: gpio, ehrpwm, etc'
+
+    return
+    --------------------------------------------------------
+
+    tuple               ('terminal', ...), empty if none offer it
+
+    _mode_map.find_gpio():
+    ========================================================
+
+    *args
+    --------------------------------------------------------
+
+    bank                str             'ex: gpio2'
+    channel             int             Channel (bit) within the bank
+
+    return
+    --------------------------------------------------------
+
+    str                 'name of terminal', or None if there isn't one
     '''
-    def __init__(self, modes_file):
+    def __init__(self, modes_file, overrides=None):
         # First grab the termmodes file, which describes which terminals
         # are capable of which modes, what mem map to look up, etc
-        # This needs to be reworked to support user-specified maps. Should
-        # probably just do it as "pass me the dict!" and let upstream load it.
-        self._mode_dict = json.loads(
-            resource_string('hwiopy', modes_file).decode('utf-8'))
-
-        # Now construct a reference dict with all of the terminals: modes
-        self._terminals = {}
-        for term, term_dict in self._mode_dict.items():
-            self._terminals[term] = list(term_dict['modes'].keys())
-
-        # Construct a second reference dict with each terminal's 
-        # mode: callables
-        self._terminal_callables = {}
-        for term, mode_list in self._terminals.items():
-            # Initialize the dict for the terminal
-            self._terminal_callables[term] = {}
-            # Check modes for implementation; if none, add generic oops
-            for mode in mode_list:
-                try:
-                    self._terminal_callables[term][mode] = \
-                        _mode_generators[mode]
-                except KeyError:
-                    self._terminal_callables[term][mode] = \
-                        _mode_not_implemented
-
-        # Generate a reference dict of only assignable modes
-        self._assignable = {}
-        for term, term_dict in self._mode_dict.items():
-            self._assignable[term] = []
-            for mode, mode_dict in term_dict['modes'].items():
-                # Validate that the mode has a number
-                if mode_dict['mode_num']:
-                    # Therefore make it assignable
-                    self._assignable[term].append(mode)
+        compiled = load_map(modes_file, _compile_mode_map, 
+            overrides=overrides)
+        self._mode_dict = MappingProxyType(compiled['mode_dict'])
+
+        # Reference dicts with all of the terminals: modes, and of only the
+        # assignable modes
+        self._terminals = MappingProxyType(compiled['terminals'])
+        self._assignable = MappingProxyType(compiled['assignable'])
+        # And the reverse indexes
+        self._mode_terminals = MappingProxyType(compiled['mode_terminals'])
+        self._gpio_channels = MappingProxyType(compiled['gpio_channels'])
+
+        # Note that the mode: callable lookups (which can't be cached) happen
+        # in __call__, straight from _mode_generators.
         
     def __call__(self, system, terminal, mode):
         # Note that the system bit is needed due to inner/outer class 
@@ -352,7 +617,9 @@ class _mode_map():
 
         # Call up the description; currently just for error trapping
         desc = self.describe(terminal, mode)
-        return self._terminal_callables[terminal][mode](system, terminal)
+        # Check modes for implementation; if none, use the generic oops
+        generator = _mode_generators.get(mode, _mode_not_implemented)
+        return generator(system, terminal)
 
     # List the available modes
     def list(self, terminal=None, only_assignable=False):
@@ -391,22 +658,367 @@ class _mode_map():
     def get_register(self, terminal, mode):
         return self.describe(terminal, mode)['register']
 
+    def terminals_for(self, mode_type):
+        return self._mode_terminals.get(mode_type, ())
+
+    def find_gpio(self, bank, channel):
+        return self._gpio_channels.get((bank, channel))
+
+class Trigger():
+    ''' A condition on a 32-bit gpio bank sample, for 
+    Sitara335.capture_triggered. Use one of the constructors:
+
+    Trigger.match(mask, value)
+        Fires on the first sample where (sample & mask) == value.
+
+    Trigger.edge(rising=0, falling=0)
+        Fires on the first sample where any channel in the rising mask went
+        from low to high, or any channel in the falling mask went from high 
+        to low, since the previous sample.
+
+    Trigger.sequence([(mask, value), ...])
+        Fires once every (mask, value) state has been matched, in order. 
+        States don't need to be matched on consecutive samples.
+
+    Trigger.pin(channel, edge='rising')
+        Shorthand for an edge trigger on a single channel, where edge is
+        'rising', 'falling', or 'both'.
+    '''
+    def __init__(self, kind, states=(), rising=0, falling=0):
+        self.kind = kind
+        self.states = tuple((mask, value & mask) for mask, value in states)
+        self.rising = rising
+        self.falling = falling
+
+    @classmethod
+    def match(cls, mask, value):
+        return cls('sequence', states=((mask, value),))
+
+    @classmethod
+    def sequence(cls, states):
+        states = tuple(states)
+        if not states:
+            raise ValueError('A sequence trigger needs at least one state.')
+        return cls('sequence', states=states)
+
+    @classmethod
+    def edge(cls, rising=0, falling=0):
+        if not (rising or falling):
+            raise ValueError('An edge trigger needs at least one channel.')
+        return cls('edge', rising=rising, falling=falling)
+
+    @classmethod
+    def pin(cls, channel, edge='rising'):
+        if edge not in ('rising', 'falling', 'both'):
+            raise ValueError('Edge must be "rising", "falling", or "both".')
+        mask = 1 << channel
+        return cls.edge(rising=mask if edge != 'falling' else 0,
+            falling=mask if edge != 'rising' else 0)
+
+def extract_channel(samples, channel, banks=1, bank=0):
+    ''' Pulls a single gpio channel out of a capture (see Sitara335.capture),
+    all at once instead of sample by sample.
+
+    *args
+    ----------------------------------------------------------------
+
+    samples             buffer          captured 32-bit bank samples
+    channel             int             0-31, channel (bit) within the bank
+
+    **kwargs
+    ----------------------------------------------------------------
+
+    banks=1             int             how many banks were captured together
+    bank=0              int             which of those banks the channel's on
+
+    return
+    ----------------------------------------------------------------
+
+    numpy array         if samples is one: 0 or 1 per sample
+    array('I')          otherwise: 0 or 1 per sample
+    '''
+    # Numpy can do it itself. Duck type it, so numpy is never imported.
+    if hasattr(samples, 'dtype'):
+        return (samples[bank::banks] >> channel) & 1
+
+    words = _as_words(samples)[bank::banks]
+    return _mask_words(words, 1 << channel, shift=channel)
+
+def demux_analog(samples, channels):
+    ''' Splits ADC samples, interleaved by channel (see the ain mode's 
+    capture), into one sequence per channel. Done by slicing, all at once,
+    instead of sample by sample.
+
+    *args
+    ----------------------------------------------------------------
+
+    samples             buffer          captured 32-bit ADC samples
+    channels            int             how many channels were captured 
+                                        together
+
+    return
+    ----------------------------------------------------------------
+
+    list                if samples is a numpy array: a strided view of it
+                        per channel (nothing is copied)
+                        otherwise: an array('I') per channel
+    '''
+    # Numpy can do it itself. Duck type it, so numpy is never imported.
+    if hasattr(samples, 'dtype'):
+        return [samples[channel::channels] for channel in range(channels)]
+
+    words = _as_words(samples)
+    # Strided memoryview slices copy out in C
+    if isinstance(words, memoryview):
+        demuxed = []
+        for channel in range(channels):
+            result = array(_word_format)
+            result.frombytes(words[channel::channels].tobytes())
+            demuxed.append(result)
+        return demuxed
+    return [words[channel::channels] for channel in range(channels)]
+
+class _page_mapping():
+    ''' A single mmap of whole pages of the memory file, shared between every
+    register block that lives within those pages. Reference counted by the 
+    system that owns it.
+    '''
+    def __init__(self, memfile, start, end):
+        # Page-aligned [start, end) addresses
+        self.start = start
+        self.end = end
+        self.refcount = 0
+        self._mmap = mmap.mmap(memfile.fileno(), end - start, offset=start)
+        # Every register view is a slice of this.
+        self.view = memoryview(self._mmap)
+
+    def close(self):
+        # All slices of self.view must already have been released.
+        self.view.release()
+        self._mmap.close()
+
+class _watched_bank():
+    ''' Everything the edge poller knows about one gpio bank.
+    '''
+    def __init__(self, regs, level):
+        self.regs = regs
+        # The datain level as of the last poll
+        self.level = level
+        # {channel mask: [(future, edge), ...]}, and all of those masks ORed
+        self.waiters = {}
+        self.waiter_mask = 0
+        # [(mask, queue, tag), ...], and all of those masks ORed
+        self.subscribers = []
+        self.subscriber_mask = 0
+
+    def update_masks(self):
+        self.waiter_mask = 0
+        for mask in self.waiters:
+            self.waiter_mask |= mask
+        self.subscriber_mask = 0
+        for mask, queue, tag in self.subscribers:
+            self.subscriber_mask |= mask
+
+class _edge_poller():
+    ''' Watches gpio banks on behalf of every asyncio waiter of a system. A 
+    single task reads the datain of each watched bank once per cycle, and 
+    only wakes the futures (and change queues) whose channels changed, so 
+    the cost of a cycle depends on the number of banks, not waiters. The 
+    task only runs while something is waiting.
+
+    All of this must be used from the thread running the event loop.
+    '''
+    def __init__(self, system):
+        self.system = system
+        self._read_in = \
+            system._resolve_register_bits.table('gpio')['datain'].index
+        # {bank register name: _watched_bank}
+        self._banks = {}
+        self._task = None
+
+    def wait(self, bank, mask, edge='both'):
+        ''' Returns a future for the next edge on the channel. Its result is 
+        the new level of the channel.
+        '''
+        if edge not in ('rising', 'falling', 'both'):
+            raise ValueError('Edge must be "rising", "falling", or "both".')
+        # Anyone here already has a running event loop, so this is free
+        import asyncio
+        watched = self._watch(bank)
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, edge)
+        watched.waiters.setdefault(mask, []).append(entry)
+        watched.update_masks()
+        # Timeouts cancel the future, which then gets cleaned up here too
+        future.add_done_callback(partial(self._forget, bank, mask, entry))
+        return future
+
+    def subscribe(self, bank, mask, queue, tag=None):
+        ''' Puts (tag, changed mask, level) into the queue whenever any of 
+        the bank's channels in mask change.
+        '''
+        watched = self._watch(bank)
+        watched.subscribers.append((mask, queue, tag))
+        watched.update_masks()
+
+    def unsubscribe(self, bank, mask, queue, tag=None):
+        watched = self._banks.get(bank)
+        if watched is None:
+            return
+        watched.subscribers.remove((mask, queue, tag))
+        watched.update_masks()
+        self._drop_if_idle(bank, watched)
+
+    def close(self):
+        ''' Called by the system when stopping. Anything still waiting gets a
+        RuntimeError.
+        '''
+        banks = self._banks
+        self._banks = {}
+        for watched in banks.values():
+            for entries in watched.waiters.values():
+                for future, edge in entries:
+                    if not future.done():
+                        future.set_exception(RuntimeError('The system was '
+                            'stopped while waiting for an edge.'))
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _watch(self, bank):
+        # Error trap: there's nothing to read from until we've started
+        if not self.system.running:
+            raise RuntimeError('Edges can only be watched while the system '
+                'is running.')
+        watched = self._banks.get(bank)
+        if watched is None:
+            regs = self.system._get_register_view(bank)
+            watched = _watched_bank(regs, regs[self._read_in])
+            self._banks[bank] = watched
+        # (Re)start the poller if it isn't already running
+        import asyncio
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return watched
+
+    def _forget(self, bank, mask, entry, future):
+        watched = self._banks.get(bank)
+        if watched is None:
+            return
+        entries = watched.waiters.get(mask)
+        if entries and entry in entries:
+            entries.remove(entry)
+            if not entries:
+                del watched.waiters[mask]
+            watched.update_masks()
+        self._drop_if_idle(bank, watched)
+
+    def _drop_if_idle(self, bank, watched):
+        if not watched.waiters and not watched.subscribers:
+            del self._banks[bank]
+
+    async def _run(self):
+        import asyncio
+        read_in = self._read_in
+        # Stops by itself when nothing is being watched anymore
+        while self._banks:
+            for watched in tuple(self._banks.values()):
+                level = watched.regs[read_in]
+                changed = level ^ watched.level
+                if changed:
+                    watched.level = level
+                    if changed & watched.waiter_mask:
+                        self._wake(watched, changed, level)
+                    if changed & watched.subscriber_mask:
+                        for mask, queue, tag in watched.subscribers:
+                            if changed & mask:
+                                queue.put_nowait((tag, changed & mask, level))
+            await asyncio.sleep(self.system.edge_poll_interval)
+
+    def _wake(self, watched, changed, level):
+        for mask, entries in tuple(watched.waiters.items()):
+            if not changed & mask:
+                continue
+            new_level = (level & mask) and 1
+            for future, edge in tuple(entries):
+                if future.done():
+                    continue
+                if edge == 'both' or (edge == 'rising') == bool(new_level):
+                    # The done callback takes it out of the waiters
+                    future.set_result(new_level)
+
 class Sitara335(core.System):
     ''' The sitara 335 SoC. Used in the Beaglebone Black.
+
+    Sitara335():
+    ======================================================
+
+    The hardware maps are shared by every Sitara335 in the process. Passing
+    any of the overrides gets this system its own copy of that map instead,
+    with the overrides applied on top of the shipped JSON (top level keys 
+    are added or replaced).
+
+    *args
+    ------------------------------------------------------
+
+    mem_filename        str             '/dev/mem', or a stand-in
+    terminal_modes=None dict            {'terminal': {...}, ...}
+    memory_map=None     dict            {'register': {...}, ...}
+    register_map=None   dict            {'register type': {...}, ...}
+
+    Sitara335.edge_poll_interval:
+    ======================================================
+
+    How long (in seconds) the asyncio edge poller sleeps between reads of 
+    the watched gpio banks. Used by core.Pin.wait_for_edge and 
+    PinGroup.changes. Defaults to 1 ms.
     '''
-    def __init__(self, mem_filename):
+    def __init__(self, mem_filename, terminal_modes=None, memory_map=None,
+            register_map=None):
         # Call the super(), creating and passing the callable resolve_mode
-        super().__init__(_mode_map('maps/sitara_termmodes.json'))
+        modes_file = 'maps/sitara_termmodes.json'
+        if terminal_modes:
+            resolve_mode = _mode_map(modes_file, terminal_modes)
+        else:
+            resolve_mode = shared(_mode_map, modes_file)
+        super().__init__(resolve_mode)
 
         # Grab the filename for the memory mapping
         self._mem_filename = mem_filename
         # Memfile will only exist when the memfile is open.
         self._memfile = None
+        # Word (32-bit) memoryviews of the register mmaps
+        self._register_views = {}
+        # And halfword (16-bit) ones, for the few blocks that need them
+        self._register_halfwords = {}
+        # Pooled mmaps, keyed by the address of every page they cover. Note
+        # that _register_mmaps then holds (mapping, byte view) tuples.
+        self._page_maps = {}
+
+        # Now grab the _memory_map object for callable use
+        if memory_map:
+            self._resolve_map = _memory_map(memory_map)
+        else:
+            self._resolve_map = shared(_memory_map)
+        # Now grab the _resolve_register_bits for calling
+        if register_map:
+            self._resolve_register_bits = _register_map(register_map)
+        else:
+            self._resolve_register_bits = shared(_register_map)
+
+        # Guards the mmap pool, and read-modify-writes of the registers
+        self._map_lock = threading.RLock()
+        self._register_locks = tuple(threading.Lock() for ii in 
+            range(_lock_stripes))
 
-        # Now create the _memory_map object for callable use
-        self._resolve_map = _memory_map()
-        # Now create the _resolve_register_bits for calling
-        self._resolve_register_bits = _register_map()
+        # Shared by everything awaiting gpio edges
+        self.edge_poll_interval = .001
+        self._edge_poller = _edge_poller(self)
+
+        # {terminal: mode generator} for everything declared, so that gpios
+        # can be started a bank at a time, and generators sharing hardware 
+        # can find each other
+        self._generators = {}
 
     def __enter__(self):
         ''' Overrides the generic chipset entry method.
@@ -423,13 +1035,16 @@ class Sitara335(core.System):
         # Open the memfile
         self._memfile = open(self._mem_filename, "r+b")
 
-        for term, mode in self.terminals_declared.items():
-            # Get the register name from the terminals_declared dict.
-            # Should the register name be folded into the terminals_declared
-            # dict? It's being accessed more than once.
-            register = self._resolve_mode.get_register(term, mode)
-            # Create the mmaps.
-            self._get_register_mmap(register)
+        # Get the register names from the terminals_declared dict. Should 
+        # the register name be folded into the terminals_declared dict? It's 
+        # being accessed more than once. Either way, plenty of terminals 
+        # share a register, so only map each one once.
+        registers = set(self._resolve_mode.get_register(term, mode) for 
+            term, mode in self.terminals_declared.items())
+        # Create the mmaps.
+        with self._map_lock:
+            for register in registers:
+                self._open_register_mmap(register)
 
     def __exit__(self, type, value, traceback):
         ''' Overrides the generic chipset exit method.
@@ -441,21 +1056,24 @@ class Sitara335(core.System):
         '''
         super().on_stop()
 
-        registers = list(self._register_mmaps)
-        # Close all mmaps and remove them from self._register_maps
-        for register in registers:
-            self._register_mmaps[register].close()
-            del self._register_mmaps[register]
+        # Nothing may poll the registers after they've been released
+        self._edge_poller.close()
+
+        # Release every register, which closes all of the pooled mmaps
+        with self._map_lock:
+            for register in list(self._register_mmaps):
+                self._release_register_mmap(register)
 
         # Cleanup the memfile
         self._memfile.close()
         self._memfile = None
 
-    def declare_linked_pin(self, terminal, mode, *args, **kwargs):
+    def declare_linked_pin(self, terminal, mode, *args, name=None, 
+            **kwargs):
         ''' Sets up a pin as something, checks for available modes, etc.
         '''
         # Don't forget to assign the result of the pin declaration
-        pin = super().declare_linked_pin(terminal, mode)
+        pin = super().declare_linked_pin(terminal, mode, name=name)
 
         # Add the register name to the pin
         pin.register_name = self._resolve_mode.get_register(terminal, mode)
@@ -464,13 +1082,43 @@ class Sitara335(core.System):
         # Now return the pin
         return pin
 
+    def declare_linked_group(self, pins, *args, **kwargs):
+        ''' Bundles already-declared gpio pins into a PinGroup.
+        '''
+        return PinGroup(self, pins)
+
+    def release_terminal(self, terminal):
+        super().release_terminal(terminal)
+        self._generators.pop(terminal, None)
+
+    def start_pins(self, pins):
+        ''' Starts gpio pins a bank at a time (see _gpio.start_bank), so the
+        cost of starting scales with the number of banks, not pins. Anything
+        else is started one by one.
+        '''
+        banks = {}
+        for pin in pins:
+            gpio = self._generators.get(pin.terminal)
+            if isinstance(gpio, _gpio):
+                banks.setdefault(gpio.register_name, []).append(gpio)
+            else:
+                pin.on_start()
+        for gpios in banks.values():
+            _gpio.start_bank(self, gpios)
+
     def _get_register_mmap(self, register):
-        ''' Returns an mmap for the specified register. If the register hasn't
-        been opened, opens it.
+        ''' Returns a (byte) memoryview of the mmapped memory for the 
+        specified register. If the register hasn't been opened, opens it.
+
+        Memory is mapped a whole page at a time, and any register blocks that
+        share pages share the same mmap (for example, cm_per and cm_wkup).
 
-        This should only be called during setup, not during initialization or
-        after the system has started.
+        Safe to call from any thread while the system is running.
         '''
+        with self._map_lock:
+            return self._open_register_mmap(register)
+
+    def _open_register_mmap(self, register):
         # Error trap: is the memfile open?
         if not self._memfile:
             raise RuntimeError('System must be started and the memory file '
@@ -478,24 +1126,329 @@ class Sitara335(core.System):
 
         # If it hasn't already been opened, open it and add it to the dict
         if register not in self._register_mmaps:
-            # This will result in a (start, end) tuple, so unpack it
-            register_start, register_end = self._resolve_map(register)
-            # Convert to start, size
-            register_size = register_end - register_start
-            # Open and add the mmap
-            self._register_mmaps[register] = mmap.mmap(
-                self._memfile.fileno(), register_size, offset=register_start)
+            # This will result in a (start, end) tuple, so unpack it. Note
+            # that end is inclusive.
+            register_start, register_end, size = \
+                self._resolve_map.block(register)
+            # Round out to whole pages
+            page_start = register_start - (register_start % _page_size)
+            page_end = register_end + 1 + (-(register_end + 1) % _page_size)
+
+            # Reuse an existing mapping if it covers the whole register
+            mapping = self._page_maps.get(page_start)
+            if mapping is None or mapping.end < page_end:
+                mapping = _page_mapping(self._memfile, page_start, page_end)
+                for page in range(page_start, page_end, _page_size):
+                    self._page_maps[page] = mapping
+            mapping.refcount += 1
+
+            # And now hand out an offset view into it
+            view = mapping.view[register_start - mapping.start:
+                register_end + 1 - mapping.start]
+            self._register_mmaps[register] = (mapping, view)
+
+        # Now it's definitely open. Return the view.
+        return self._register_mmaps[register][1]
+
+    def _release_register_mmap(self, register):
+        ''' Releases the views for the specified register, and closes the 
+        underlying mmap if nothing else is using it. Any pin still holding 
+        onto a view will get a ValueError instead of a segfault.
+        '''
+        mapping, view = self._register_mmaps.pop(register)
+        if register in self._register_views:
+            self._register_views.pop(register).release()
+        if register in self._register_halfwords:
+            self._register_halfwords.pop(register).release()
+        view.release()
+
+        mapping.refcount -= 1
+        if not mapping.refcount:
+            # Forget every page that still points to this mapping
+            for page in range(mapping.start, mapping.end, _page_size):
+                if self._page_maps.get(page) is mapping:
+                    del self._page_maps[page]
+            mapping.close()
+
+    def _get_register_view(self, register):
+        ''' Returns a memoryview of the specified register's mmap, cast to 
+        32-bit words, so that view[offset // 4] reads or writes one whole, 
+        aligned register without allocating anything. Opens the mmap if 
+        needed.
+
+        Same caveats as _get_register_mmap.
+        '''
+        # Once a view exists it stays put until stopping, so only the first
+        # call needs the lock.
+        view = self._register_views.get(register)
+        if view is None:
+            with self._map_lock:
+                if register not in self._register_views:
+                    self._register_views[register] = \
+                        self._open_register_mmap(register).cast(_word_format)
+                view = self._register_views[register]
+        return view
+
+    def _get_register_halfwords(self, register):
+        ''' Like _get_register_view, but cast to 16-bit halfwords, so that 
+        view[offset // 2] reads or writes one whole 16-bit register (ex the
+        epwm time-base and compare registers).
+        '''
+        view = self._register_halfwords.get(register)
+        if view is None:
+            with self._map_lock:
+                if register not in self._register_halfwords:
+                    self._register_halfwords[register] = \
+                        self._open_register_mmap(register).cast(
+                        _halfword_format)
+                view = self._register_halfwords[register]
+        return view
+
+    def _modify_register(self, register, view, index, mask, value):
+        ''' Read-modify-write of the bits in mask, under the register block's
+        lock. view is a word or halfword view of the register's block, and 
+        value should already be shifted into place.
+        '''
+        with self._register_lock(register):
+            view[index] = (view[index] & ~mask) | value
+
+    def _start_clock(self, register):
+        ''' Makes sure the functional clock for the register's module is 
+        enabled in its clock control block (cm_per or cm_wkup). Only writes
+        if it isn't already.
+        '''
+        clockcontrol_name = self._resolve_map.get_clockcontrol(register)
+        if clockcontrol_name is None:
+            raise RuntimeError('No clock control is known for ' + register +
+                '.')
+        index = self._resolve_register_bits.table(clockcontrol_name)[
+            self._resolve_map.get_clockcontrol_name(register)].index
+
+        # Every CLKCTRL register has the same layout, which is described
+        # (for now) with the gpios.
+        mode = self._resolve_register_bits.table('gpio')['clock_control'].\
+            functions['mode']
+        enabled = mode.values['enable']
+
+        # Every other peripheral's clock lives in the same block
+        regs = self._get_register_view(clockcontrol_name)
+        with self._register_lock(clockcontrol_name):
+            clock_register = regs[index]
+            if clock_register & mode.mask != enabled:
+                regs[index] = (clock_register & ~mode.mask) | enabled
+
+    def _register_lock(self, register):
+        ''' Returns the lock to hold while reading, modifying, and writing 
+        back anything in the register block. Plain writes to set/clear style
+        registers don't need it.
+        '''
+        # By address rather than by name, since str hashes change from one 
+        # process to the next, and so would which blocks share a stripe. 
+        # Fibonacci hashing spreads out neighbouring blocks (the four gpio 
+        # banks all get their own stripe, for one).
+        start = self._resolve_map.block(register).start
+        return self._register_locks[((start >> 8) * 0x9E3779B1 & 
+            0xFFFFFFFF) >> (32 - _lock_stripe_bits)]
+
+    def capture(self, banks, count, out=None, timestamps=None):
+        ''' Samples the whole datain register of one or more gpio banks, 
+        count times, as fast as possible. Think logic analyzer. The system 
+        must be running, and the channels you care about configured as 
+        inputs (or as outputs, if you want to see what you're driving).
+
+        Samples are interleaved by bank: sample n of bank b ends up in 
+        out[n * len(banks) + b]. Use extract_channel to pull out individual
+        pins afterwards. Nothing is allocated per sample, so to keep it that
+        way across captures, pass the same buffers in every time.
+
+        *args
+        ----------------------------------------------------------------
+
+        banks               str         'gpio1'
+                            iterable    ['gpio1', 'gpio2', ...]
+        count               int         number of samples per bank
+
+        **kwargs
+        ----------------------------------------------------------------
+
+        out=None            buffer      preallocated, >= count * len(banks)
+                                        32-bit items, ex array('I'), numpy
+        timestamps=None     buffer      preallocated, >= count items, for 
+                                        the perf_counter_ns of each sample
+                            True        allocate one
+
+        return
+        ----------------------------------------------------------------
+
+        tuple               (out, timestamps)
+        '''
+        # Error trap: must be running
+        if not self.running:
+            raise RuntimeError('System must be started to capture.')
+
+        if isinstance(banks, str):
+            banks = (banks,)
+        views = tuple(self._get_register_view(bank) for bank in banks)
+        read_in = self._resolve_register_bits.table('gpio')['datain'].index
+
+        # Get the buffers ready
+        samples = count * len(views)
+        if out is None:
+            out = array(_word_format, bytes(_word_size * samples))
+        elif len(out) < samples:
+            raise ValueError('Output buffer too small for ' + str(samples) +
+                ' samples.')
+        if timestamps is True:
+            timestamps = array('Q', bytes(8 * count))
+        elif timestamps is not None and len(timestamps) < count:
+            raise ValueError('Timestamp buffer too small for ' + str(count) +
+                ' samples.')
+
+        perf_counter_ns = time.perf_counter_ns
+        # One bank is the usual case, so give it the tightest loops
+        if len(views) == 1:
+            regs = views[0]
+            if timestamps is None:
+                for ii in range(count):
+                    out[ii] = regs[read_in]
+            else:
+                for ii in range(count):
+                    out[ii] = regs[read_in]
+                    timestamps[ii] = perf_counter_ns()
+        else:
+            ii = 0
+            for jj in range(count):
+                for regs in views:
+                    out[ii] = regs[read_in]
+                    ii += 1
+                if timestamps is not None:
+                    timestamps[jj] = perf_counter_ns()
+
+        return out, timestamps
+
+    def capture_triggered(self, bank, trigger, pre=1000, post=1000, 
+            timeout=None):
+        ''' Waits for a Trigger on a gpio bank, then returns the samples 
+        around it. While waiting, only the last pre samples are kept, in a
+        ring buffer, so waiting (however long) takes no more memory than the
+        window itself. The trigger is evaluated on the whole 32-bit sample at
+        once, so watching all 32 channels costs the same as watching one.
+
+        *args
+        ----------------------------------------------------------------
+
+        bank                str         'gpio1'
+        trigger             object      Trigger
+
+        **kwargs
+        ----------------------------------------------------------------
 
-        # Now it's definitely open. Return the mmap.
-        return self._register_mmaps[register]
+        pre=1000            int         samples to keep from before trigger
+        post=1000           int         samples from the trigger on
+        timeout=None        float       seconds to wait before giving up and
+                                        raising TimeoutError
+
+        return
+        ----------------------------------------------------------------
+
+        tuple               (array('I') window, index of trigger sample)
+
+        Note that if the trigger fires before pre samples have been taken,
+        the window (and the trigger index) will be correspondingly shorter.
+        '''
+        # Error trap: must be running
+        if not self.running:
+            raise RuntimeError('System must be started to capture.')
+        if post < 1:
+            raise ValueError('Need at least one post-trigger sample (the '
+                'trigger itself).')
+
+        regs = self._get_register_view(bank)
+        read_in = self._resolve_register_bits.table('gpio')['datain'].index
+
+        # Ring buffer for the pre-trigger samples. Keep at least one slot so
+        # the loops don't need to special case pre=0.
+        ring_size = max(pre, 1)
+        ring = array(_word_format, bytes(_word_size * ring_size))
+        pos = 0
+        taken = 0
+
+        perf_counter = time.perf_counter
+        if timeout is not None:
+            deadline = perf_counter() + timeout
+        # How often (in samples, minus one) to check the clock
+        check = 0x3FF
+
+        if trigger.kind == 'edge':
+            rising, falling = trigger.rising, trigger.falling
+            previous = regs[read_in]
+            while True:
+                word = regs[read_in]
+                # All 32 channels at once: which ones changed, and how?
+                if (~previous & word & rising) | (previous & ~word & falling):
+                    break
+                ring[pos] = word
+                pos += 1
+                if pos == ring_size:
+                    pos = 0
+                taken += 1
+                if timeout is not None and not taken & check and \
+                        perf_counter() > deadline:
+                    raise TimeoutError('Trigger did not fire.')
+                previous = word
+        else:
+            states = trigger.states
+            mask, value = states[0]
+            stage = 0
+            while True:
+                word = regs[read_in]
+                if word & mask == value:
+                    stage += 1
+                    if stage == len(states):
+                        break
+                    mask, value = states[stage]
+                ring[pos] = word
+                pos += 1
+                if pos == ring_size:
+                    pos = 0
+                taken += 1
+                if timeout is not None and not taken & check and \
+                        perf_counter() > deadline:
+                    raise TimeoutError('Trigger did not fire.')
+
+        # Triggered! Grab the rest of the post-trigger samples.
+        kept = min(taken, pre)
+        window = array(_word_format, bytes(_word_size * (kept + post)))
+        window[kept] = word
+        for ii in range(kept + 1, kept + post):
+            window[ii] = regs[read_in]
+
+        # Now unroll the ring into the start of the window, oldest first
+        if kept:
+            if taken > ring_size:
+                window[0:ring_size - pos] = ring[pos:]
+                window[ring_size - pos:kept] = ring[:pos]
+            else:
+                window[0:kept] = ring[:kept]
+
+        return window, kept
 
 class _gpio():
     ''' Callable class for creating a GPIO terminal for cortex A8 SoCs.
     Functions as a generator for core.Pin update, status, and setup methods,
     as well as any other methods relevant to the gpio.
+
+    One of these lives behind every gpio pin, so it's slotted, and only ever
+    references the (shared) mode description and register table.
     '''
+    __slots__ = ('desc', 'system', 'terminal', 'direction', 'value', '_regs',
+        'register_name', 'clockcontrol_name', '_lock', 'channel_number', 
+        'channel_mask', 'register_map', 'set_out', 'clear_out', 
+        'output_enable', 'read_in')
+
     def __init__(self, system, terminal):
         # Doublecheck that the terminal can be set as a gpio and get its deets
+        # (the mode map's own dict, not a copy)
         self.desc = system._resolve_mode.describe(terminal, mode='gpio')
 
         self.system = system
@@ -503,58 +1456,50 @@ class _gpio():
 
         self.direction = None
         self.value = None
-        self._mmap = None
-        self._clockcontrol_mmap = None
+        # Word view of the gpio bank, once started
+        self._regs = None
 
         # Use the description dictionary to figure out which gpio register
         self.register_name = \
             system._resolve_mode.get_register(terminal, 'gpio')
         self.clockcontrol_name = \
             system._resolve_map.get_clockcontrol(self.register_name)
+        # For read-modify-writes of the oe
+        self._lock = system._register_lock(self.register_name)
 
         # Now resolve the memory address (start, end tuple)
         self.channel_number = int(self.desc['register_detail'])
-        self.channel_mask = 1 << self.channel_number
         # And generate a bit-shifted description of which channel this is
-        self.channel_flag = struct.pack('<L', self.channel_mask)
-        # Grab the description of all gpio registers:
-        self.register_map = self.system._resolve_register_bits('gpio')
-
-        # For fast access store the setdataout and cleardataout bits as slices
-        # This yields an (address, bit length) tuple
-        set_out = self.register_map['setdataout']
-        set_out_bytes = ceil(set_out[1] / 8)
-        # We want (byte start: byte end) slice
-        self.set_out = slice(set_out[0], set_out[0] + set_out_bytes)
-        # (address, bit length) tuple
-        clear_out = self.register_map['cleardataout']
-        clear_out_bytes = ceil(clear_out[1] / 8)
-        # To (byte start: byte end) slice
-        self.clear_out = slice(clear_out[0], clear_out[0] + clear_out_bytes)
-        oe = self.register_map['oe']
-        oe_bytes = ceil(oe[1]/8)
-        self.output_enable = slice(oe[0], oe[0] + oe_bytes)
-
-        # Input register messiness
-        read_input = self.register_map['datain']
-        read_input_size = ceil(read_input[1] / 8)
-        self.read_in = slice(read_input[0], read_input[0] + read_input_size)
+        self.channel_mask = 1 << self.channel_number
+        # Grab the (shared) description of all gpio registers:
+        self.register_map = self.system._resolve_register_bits.table('gpio')
 
-        # I looooooooooooove late-binding closures right now, this shit is 
-        # fucking magical. I can't believe this worked first try.
-        self.methods = {}
-        # self.methods['setup'] = self.setup
-        self.methods['update'] = self.update
-        self.methods['status'] = self.status
-        self.methods['on_start'] = self.on_start
-        self.methods['on_stop'] = self.on_stop
-        self.methods['output_high_nocheck'] = self.output_high_nocheck
-        self.methods['output_low_nocheck'] = self.output_low_nocheck
-        self.methods['input_nocheck'] = self.input_nocheck
-        self.methods['config'] = self.config
+        # For fast access store the word indices of the registers we use. 
+        self.set_out = self.register_map['setdataout'].index
+        self.clear_out = self.register_map['cleardataout'].index
+        self.output_enable = self.register_map['oe'].index
+        self.read_in = self.register_map['datain'].index
+
+        # Let the system know, so it can start us along with our bank
+        system._generators[terminal] = self
 
     def __call__(self):
-        return self.methods
+        # I looooooooooooove late-binding closures right now, this shit is 
+        # fucking magical. I can't believe this worked first try.
+        # Built on demand: the pin keeps the dict, so there's no need for us
+        # to hang on to a second reference.
+        return {
+            # 'setup': self.setup,
+            'update': self.update,
+            'status': self.status,
+            'on_start': self.on_start,
+            'on_stop': self.on_stop,
+            'output_high_nocheck': self.output_high_nocheck,
+            'output_low_nocheck': self.output_low_nocheck,
+            'input_nocheck': self.input_nocheck,
+            'config': self.config,
+            'fast_methods': self.fast_methods,
+            'edge_future': self.edge_future}
 
     def update(self, status):
         # Check self.direction
@@ -564,25 +1509,47 @@ class _gpio():
     def output_high_nocheck(self):
         # Update HIGH/True without checking if input/output.
         # This could be memoized
-        self._mmap[self.set_out] = self.channel_flag
+        self._regs[self.set_out] = self.channel_mask
         self.value = 1
 
     def output_low_nocheck(self):
         # Update LOW/False without checking if input/output.
         # This could be memoized
-        self._mmap[self.clear_out] = self.channel_flag
+        self._regs[self.clear_out] = self.channel_mask
         self.value = 0
 
     def input_nocheck(self):
         # Read the input levels without checking if input/output.
-        # This is another good target for optimization
-        # Convert the register into something we can do bitwise operations on
-        status = struct.unpack('<L', self._mmap[self.read_in])[0]
         # Bitwise anding with the channel flag -> zero or nonzero.
         # Truth anding that with 1 -> 0 or 1
-        self.value = (status & self.channel_mask) and 1
+        self.value = (self._regs[self.read_in] & self.channel_mask) and 1
         return self.value
 
+    def fast_methods(self):
+        ''' Returns high, low, and read functions specialized for this pin.
+        Everything (the register view, the indices, the mask) is bound in,
+        so calls don't need any attribute lookups. They also skip updating 
+        self.value. Only valid while started.
+        '''
+        # The writes don't even need a python frame
+        high = partial(self._regs.__setitem__, self.set_out, 
+            self.channel_mask)
+        low = partial(self._regs.__setitem__, self.clear_out, 
+            self.channel_mask)
+
+        def read(regs=self._regs, read_in=self.read_in, 
+                mask=self.channel_mask):
+            return (regs[read_in] & mask) and 1
+
+        return {'high': high, 'low': low, 'read': read}
+
+    def edge_future(self, edge):
+        ''' Returns an asyncio future for the next edge on the pin, from the 
+        system's shared edge poller.
+        '''
+        return self.system._edge_poller.wait(self.register_name, 
+            self.channel_mask, edge)
+
     def status(self):
         print(self.direction)
 
@@ -590,85 +1557,69 @@ class _gpio():
     # I fucking love late binding closures.
     # No __enter__ as this is not intended for external use / context mgmt
     def on_start(self):
+        self.start_bank(self.system, (self,))
+
+    @classmethod
+    def start_bank(cls, system, gpios):
+        ''' Starts several gpios in the same bank at once: the bank clock is
+        checked once, and the oe is written once for all of them (instead of
+        once per gpio).
+        '''
         # Error trap: is direction configured?
-        if not self.direction:
-            raise RuntimeError('GPIO direction (in/out) has not been '
-                'configured.')
+        for gpio in gpios:
+            if not gpio.direction:
+                raise RuntimeError('GPIO direction (in/out) has not been '
+                    'configured.')
+
+        # They all share these
+        first = gpios[0]
+        regs = system._get_register_view(first.register_name)
+
+        # Update everyone's _regs, and collect the directions. Note that 
+        # in the oe, a bit of 1 indicates use as an INPUT, not an output.
+        inputs = 0
+        outputs = 0
+        for gpio in gpios:
+            gpio._regs = regs
+            if gpio.direction == 'out':
+                outputs |= gpio.channel_mask
+            else:
+                inputs |= gpio.channel_mask
 
-        # Update my _mmap, start the clock, and set direction
-        self._mmap = self.system._get_register_mmap(self.register_name)
-        self._clockcontrol_mmap = \
-            self.system._get_register_mmap(self.clockcontrol_name)
-        self._start_bus_clock()
-        self._set_direction()
+        # Start the clock, and set every direction in one go
+        first._start_bus_clock()
+        with first._lock:
+            regs[first.output_enable] = \
+                (regs[first.output_enable] & ~outputs) | inputs
 
     # No __exit__ as this is not intended for external use / context managment
     def on_stop(self):
-        self._mmap = None
+        self._regs = None
 
     def _set_direction(self):
         # Set or clear the output enable register. Note that in the oe, 
         # a but of 1 indicates use as an INPUT, not an output.
-        out_ena = struct.unpack('<L', self._mmap[self.output_enable])[0]
-        if self.direction == 'out':
-            # Set the channel bit to 0 (note the flip)
-            out_ena &= ~(1 << self.channel_number)
-        elif self.direction == 'in':
-            # Set the channel bit to 1
-            out_ena |= (1 << self.channel_number)
-        else:
+        if self.direction not in ('in', 'out'):
             raise RuntimeError('Invalid direction specified.')
-        # At any rate, now take care of all of that nonsense.
-        self._mmap[self.output_enable] = struct.pack('<L', out_ena)
+        # The rest of the bank shares the oe, so don't let anyone else slip
+        # a write in between our read and write.
+        with self._lock:
+            out_ena = self._regs[self.output_enable]
+            if self.direction == 'out':
+                # Set the channel bit to 0 (note the flip)
+                out_ena &= ~(1 << self.channel_number)
+            else:
+                # Set the channel bit to 1
+                out_ena |= (1 << self.channel_number)
+            # At any rate, now take care of all of that nonsense.
+            self._regs[self.output_enable] = out_ena
 
     def _start_bus_clock(self):
         ''' Makes sure the bus clock for the gpio bank is running. Together
         with _set_direction, these make up the two functions of the sysfs
         "export" mapping.
         '''
-        # First grab the mmap.
-        # Well, we already have the mmap. We got it in on_start.
-
-        # Now let's hunt down the clock register offset
-        # God this is such a fucking mess
-        clockmap = self.system._resolve_register_bits.\
-            _register_dict[self.clockcontrol_name]
-        # I feel gross writing this.
-        offset = int(clockmap[self.register_name]['offset'], base=16)
-        # ewwwwww
-
-        # Get the relevant register description dictionaries
-        idle_status = self.system._resolve_register_bits.\
-            _register_dict['gpio']['clock_control']['functions']['idle_status']
-        mode = self.system._resolve_register_bits.\
-            _register_dict['gpio']['clock_control']['functions']['mode']
-
-        # Start checkin' shit
-        # Unpack the whole bus. Remember that 32 bits is the minimum size we 
-        # can deal with.
-        reg_slice = slice(offset, offset + 4)
-        clock_register = \
-            struct.unpack('<L', self._clockcontrol_mmap[reg_slice])[0]
-        # Check if the mode is disabled
-        # First isolate the mode field
-        mode_mask = 0
-        for bit in mode['__bits__']:
-            mode_mask |= 1 << bit
-        check_mode = mode_mask & clock_register
-        # Okay, we have just the mode field. Is it enabled or disabled?
-        enabled = int(mode['enable'], base=16) << mode['__bits__'][0]
-        if check_mode & enabled:
-            # Okay, the clock is enabled. Might need to check the idle status.
-            pass
-        # Not enabled!
-        else: 
-            # Repack as enabled
-            # Clear only the mode field
-            clock_register &= (~mode_mask)
-            # Set the mode field
-            clock_register |= enabled
-            packed = struct.pack('<L', clock_register)
-            self._clockcontrol_mmap[reg_slice] = packed
+        self.system._start_clock(self.register_name)
 
     def config(self, direction):
         # Error trap the direction (only in/out)
@@ -684,6 +1635,2167 @@ class _gpio():
 
 _mode_generators['gpio'] = _gpio
 
-def _mode_not_implemented():
+class PinGroup(core.Plug):
+    ''' A group of gpio pins that are updated together. Pins are sorted into
+    their gpio banks, and every update costs one setdataout write and one
+    cleardataout write per bank, no matter how many pins are in the group.
+    Pins in the same bank therefore change within the same bus cycle (well,
+    the rising ones together and then the falling ones together).
+
+    PinGroup():
+    ======================================================
+
+    *args
+    ------------------------------------------------------
+
+    system              object          Sitara335 the pins are declared on
+    pins                iterable        [core.Pin, ...] in gpio mode
+
+    PinGroup.output_nocheck():
+    ======================================================
+
+    Drives every pin in the group at once, without checking direction.
+
+    *args
+    ------------------------------------------------------
+
+    values              sequence        [truthy or falsy, ...] in pin order
+
+    PinGroup.output_high_nocheck(), PinGroup.output_low_nocheck():
+    ======================================================
+
+    Drives every pin in the group high (or low) at once.
+
+    PinGroup.watch_edges(), PinGroup.unwatch_edges(), PinGroup.poll_edges():
+    ======================================================
+
+    Hardware edge detection. watch_edges(edge='both') programs the bank 
+    risingdetect/fallingdetect registers for the group's pins, so the 
+    hardware latches edges even if they come and go between polls. 
+    poll_edges() then returns [core.Pin, ...] for every pin with an edge 
+    since the last poll, using one irqstatus_raw read per bank. Stopping 
+    puts the group's bits of the detect registers back the way they were 
+    before the group changed them.
+
+    PinGroup.changes():
+    ======================================================
+
+    Asynchronous iterator over every level change of the group's pins, 
+    seen by the system's shared edge poller. Changes queue up until they are
+    consumed.
+
+        async for pin, level in group.changes():
+
+    yield
+    ------------------------------------------------------
+
+    tuple               (core.Pin, 0 or 1)
+
+    PinGroup.compile_waveform():
+    ======================================================
+
+    Precomputes a waveform for playback. See Waveform.
+
+    *args
+    ------------------------------------------------------
+
+    samples             buffer          32-bit bank states, ex array('I')
+                        dict            {'bank': buffer, ...}
+
+    return
+    ------------------------------------------------------
+
+    object              Waveform
+    '''
+    def __init__(self, system, pins):
+        super().__init__()
+        self.system = system
+
+        # Which (bank index, channel mask) does each pin (in order) use?
+        self._pin_masks = []
+        # Bank register names, in order of first appearance
+        self._banks = []
+        # The combined channel mask for each bank
+        self._bank_masks = []
+
+        for pin in pins:
+            # Error trap: only gpio can be grouped
+            if pin.mode != 'gpio':
+                raise ValueError('Only gpio pins can be grouped. Pin ' +
+                    str(pin.num) + ' is in ' + str(pin.mode) + ' mode.')
+            # Error trap: no pin twice
+            key = pin.num or pin.terminal
+            if key in self.pins:
+                raise ValueError('Pin ' + str(key) + ' is already in the '
+                    'group.')
+            self.pins[key] = pin
+
+            # Work out the bank and channel from the terminal description
+            desc = system._resolve_mode.describe(pin.terminal, 'gpio')
+            mask = 1 << int(desc['register_detail'])
+            if pin.register_name not in self._banks:
+                self._banks.append(pin.register_name)
+                self._bank_masks.append(0)
+            bank = self._banks.index(pin.register_name)
+            self._bank_masks[bank] |= mask
+            self._pin_masks.append((bank, mask))
+
+        self._pin_masks = tuple(self._pin_masks)
+        self._bank_masks = tuple(self._bank_masks)
+        # For read-modify-writes of the detect registers
+        self._locks = tuple(system._register_lock(bank) for bank in 
+            self._banks)
+
+        # The set/clear word indices are the same for every bank
+        register_map = system._resolve_register_bits.table('gpio')
+        self._set_out = register_map['setdataout'].index
+        self._clear_out = register_map['cleardataout'].index
+
+        # Edge detection registers
+        self._raw_status = register_map['irqstatus_raw_0'].index
+        self._irq_status = register_map['irqstatus_0'].index
+        rising = register_map['risingdetect'].index
+        falling = register_map['fallingdetect'].index
+        self._edge_registers = {'rising': (rising,), 
+            'falling': (falling,), 
+            'both': (rising, falling)}
+        # The edge being watched, if any
+        self._edge = None
+        # (channel mask, pin) for each pin in each bank, for poll_edges
+        self._bank_pins = tuple(
+            tuple((mask, pin) for (bank, mask), pin in 
+                zip(self._pin_masks, self.pins.values()) if bank == ii)
+            for ii in range(len(self._banks)))
+
+        # Populated with one register view per bank by on_start
+        self._views = None
+        # Our bits of each bank's detect registers, as they were before we
+        # touched them ({register: bits} per bank), to put back on stop
+        self._saved_edges = None
+
+    def on_start(self):
+        ''' Grabs the register view for each bank. Called by the device once 
+        the pins have been started.
+        '''
+        self._views = tuple(self.system._get_register_view(bank) for bank in
+            self._banks)
+        self._saved_edges = None
+        if self._edge:
+            self._program_edges()
+
+    def on_stop(self):
+        # Leave the detect registers the way we found them (our bits of 
+        # them, anyways), if we changed them
+        if self._saved_edges is not None:
+            for regs, mask, lock, saved in zip(self._views, 
+                    self._bank_masks, self._locks, self._saved_edges):
+                with lock:
+                    for register, bits in saved.items():
+                        regs[register] = (regs[register] & ~mask) | bits
+            self._saved_edges = None
+        self._views = None
+
+    def output_nocheck(self, values):
+        # Build up the set and clear masks for every bank
+        set_masks = [0] * len(self._banks)
+        clear_masks = [0] * len(self._banks)
+        for (bank, mask), value in zip(self._pin_masks, values):
+            if value:
+                set_masks[bank] |= mask
+            else:
+                clear_masks[bank] |= mask
+
+        # And now, one write apiece
+        set_out = self._set_out
+        clear_out = self._clear_out
+        for regs, set_mask, clear_mask in \
+                zip(self._views, set_masks, clear_masks):
+            regs[set_out] = set_mask
+            regs[clear_out] = clear_mask
+
+    def output_high_nocheck(self):
+        for regs, mask in zip(self._views, self._bank_masks):
+            regs[self._set_out] = mask
+
+    def output_low_nocheck(self):
+        for regs, mask in zip(self._views, self._bank_masks):
+            regs[self._clear_out] = mask
+
+    def compile_waveform(self, samples):
+        return Waveform(self, samples)
+
+    async def changes(self):
+        import asyncio
+        poller = self.system._edge_poller
+        queue = asyncio.Queue()
+        # Tag each subscription with the bank index, to find its pins
+        subscriptions = tuple((bank, mask, queue, ii) for ii, (bank, mask) in
+            enumerate(zip(self._banks, self._bank_masks)))
+        for subscription in subscriptions:
+            poller.subscribe(*subscription)
+        try:
+            while True:
+                ii, changed, level = await queue.get()
+                for mask, pin in self._bank_pins[ii]:
+                    if changed & mask:
+                        yield pin, (level & mask) and 1
+        finally:
+            for subscription in subscriptions:
+                poller.unsubscribe(*subscription)
+
+    def watch_edges(self, edge='both'):
+        ''' Turns on the bank's hardware edge detection for every pin in the
+        group. If the group isn't started yet, it will be turned on when it
+        is.
+        '''
+        if edge not in self._edge_registers:
+            raise ValueError('Edge must be "rising", "falling", or "both".')
+        self._edge = edge
+        if self._views is not None:
+            self._program_edges()
+
+    def unwatch_edges(self):
+        ''' Turns the hardware edge detection back off.
+        '''
+        self._edge = None
+        if self._views is not None:
+            self._program_edges()
+
+    def poll_edges(self):
+        ''' Returns a list of every pin that has seen a watched edge since 
+        the last poll (or since watch_edges), and acknowledges them. Costs 
+        one read per bank, plus one write per bank that saw anything, however
+        many pins are being watched.
+        '''
+        fired = []
+        raw_status = self._raw_status
+        irq_status = self._irq_status
+        for regs, mask, bank_pins in \
+                zip(self._views, self._bank_masks, self._bank_pins):
+            status = regs[raw_status] & mask
+            if status:
+                # Writing a 1 clears the event
+                regs[irq_status] = status
+                for pin_mask, pin in bank_pins:
+                    if status & pin_mask:
+                        fired.append(pin)
+        return fired
+
+    def _program_edges(self):
+        # Set our channels in the detect registers for the chosen edge, and
+        # clear them in the others
+        if self._edge:
+            enabled = self._edge_registers[self._edge]
+        else:
+            enabled = ()
+        # The first time round, remember what was there
+        if self._saved_edges is None:
+            self._saved_edges = tuple({register: regs[register] & mask for 
+                register in self._edge_registers['both']} for regs, mask in 
+                zip(self._views, self._bank_masks))
+        for regs, mask, lock in \
+                zip(self._views, self._bank_masks, self._locks):
+            with lock:
+                for register in self._edge_registers['both']:
+                    if register in enabled:
+                        regs[register] |= mask
+                    else:
+                        regs[register] &= ~mask
+            # Forget anything that happened before now. This one is write-1-
+            # to-clear, so it doesn't need the lock.
+            regs[self._irq_status] = mask
+
+class Waveform():
+    ''' A precompiled gpio waveform, played back through a PinGroup. Each 
+    sample is the state of a whole gpio bank (bit n is channel n), and only
+    the channels belonging to the group's pins are driven; every other bit is
+    ignored. Compiling turns every sample into a (set mask, clear mask) pair
+    once, so playback is nothing but two register writes per bank per sample.
+
+    Waveform():
+    ======================================================
+
+    *args
+    ------------------------------------------------------
+
+    group               object          PinGroup to play through
+    samples             buffer          bank states, if the group has 1 bank
+                        dict            {'bank': buffer, ...} with every bank
+                                        in the group, all the same length
+
+    Waveform.play():
+    ======================================================
+
+    Plays the waveform. The group must be started. Note that with a rate, 
+    playback busy-waits (python can't sleep that precisely), so it will 
+    hog a core for the duration.
+
+    **kwargs
+    ------------------------------------------------------
+
+    rate=None           float           samples per second, or None for as
+                                        fast as possible
+    repeat=1            int             times to play it through
+    timestamps=False    bool            time every sample to measure jitter.
+                                        Always done when rate is set.
+
+    return
+    ------------------------------------------------------
+
+    dict                {'samples': int, 'duration': seconds, 
+                        'rate': samples per second, 
+                        'jitter': stdev of sample period in seconds or None}
+    '''
+    def __init__(self, group, samples):
+        self.group = group
+
+        # Error trap: multibank groups need to be told which bank is which
+        if not isinstance(samples, dict):
+            if len(group._banks) != 1:
+                raise ValueError('Groups spanning more than one bank need '
+                    'a dict of samples for each bank.')
+            samples = {group._banks[0]: samples}
+        if set(samples) != set(group._banks):
+            raise ValueError('Waveform banks must match the group banks: ' + 
+                str(group._banks))
+
+        # Now compile each bank into set and clear masks
+        self._set_masks = []
+        self._clear_masks = []
+        for bank, mask in zip(group._banks, group._bank_masks):
+            words = _as_words(samples[bank])
+            self._set_masks.append(_mask_words(words, mask))
+            self._clear_masks.append(_mask_words(words, mask, invert=True))
+
+        self.length = len(self._set_masks[0])
+        # Error trap: all banks the same length
+        for set_masks in self._set_masks:
+            if len(set_masks) != self.length:
+                raise ValueError('Every bank needs the same number of '
+                    'samples.')
+
+    def __len__(self):
+        return self.length
+
+    def play(self, rate=None, repeat=1, timestamps=False):
+        # Error trap: group must be running
+        if self.group._views is None:
+            raise RuntimeError('Group must be started to play a waveform.')
+
+        samples = self.length * repeat
+        if rate or timestamps:
+            times = array('d', bytes(8 * samples))
+        else:
+            times = None
+
+        set_out = self.group._set_out
+        clear_out = self.group._clear_out
+        _start = time.perf_counter()
+        # Single bank: the tightest loop we can manage
+        if len(self.group._views) == 1:
+            regs = self.group._views[0]
+            set_masks = self._set_masks[0]
+            clear_masks = self._clear_masks[0]
+            perf_counter = time.perf_counter
+            ii = 0
+            if rate:
+                period = 1 / rate
+                next_time = perf_counter()
+                for jj in range(repeat):
+                    for set_mask, clear_mask in zip(set_masks, clear_masks):
+                        # Busy wait for the next sample
+                        while perf_counter() < next_time:
+                            pass
+                        next_time += period
+                        regs[set_out] = set_mask
+                        regs[clear_out] = clear_mask
+                        times[ii] = perf_counter()
+                        ii += 1
+            elif times is not None:
+                for jj in range(repeat):
+                    for set_mask, clear_mask in zip(set_masks, clear_masks):
+                        regs[set_out] = set_mask
+                        regs[clear_out] = clear_mask
+                        times[ii] = perf_counter()
+                        ii += 1
+            else:
+                for jj in range(repeat):
+                    for set_mask, clear_mask in zip(set_masks, clear_masks):
+                        regs[set_out] = set_mask
+                        regs[clear_out] = clear_mask
+        # Several banks
+        else:
+            banks = tuple(zip(self.group._views, self._set_masks, 
+                self._clear_masks))
+            period = 1 / rate if rate else 0
+            perf_counter = time.perf_counter
+            next_time = perf_counter()
+            ii = 0
+            for jj in range(repeat):
+                for kk in range(self.length):
+                    if rate:
+                        while perf_counter() < next_time:
+                            pass
+                        next_time += period
+                    for regs, set_masks, clear_masks in banks:
+                        regs[set_out] = set_masks[kk]
+                        regs[clear_out] = clear_masks[kk]
+                    if times is not None:
+                        times[ii] = perf_counter()
+                        ii += 1
+        _end = time.perf_counter()
+
+        duration = _end - _start
+        achieved = samples / duration if duration else float('inf')
+        jitter = None
+        # With timestamps, the rate is better measured between samples
+        if times is not None and samples > 2:
+            achieved = (samples - 1) / (times[-1] - times[0])
+            import statistics
+            jitter = statistics.pstdev(
+                [times[ii + 1] - times[ii] for ii in range(samples - 1)])
+        return {'samples': samples, 
+            'duration': duration,
+            'rate': achieved,
+            'jitter': jitter}
+
+# The PWMSS functional clock, which clocks both the epwm time-bases and the
+# ecap counters
+_pwm_clock = 100000000
+
+# Every (divider, clkdiv, hspclkdiv) that the epwm time-base prescalers can
+# do, smallest divider first. TBCLK = SYSCLKOUT / (2**clkdiv * hspclkdiv), 
+# where a hspclkdiv field of n divides by 2n (or 1, for 0).
+_epwm_dividers = tuple(sorted(((1 << clkdiv) * (2 * hspclkdiv or 1), clkdiv,
+    hspclkdiv) for clkdiv in range(8) for hspclkdiv in range(8)))
+
+class _pwm():
+    ''' Base for the hardware PWM mode generators. The PWM is entirely done 
+    by the PWMSS, so once started, nothing in python has to keep running. 
+    Changing the duty cycle is one register write, and the registers are 
+    shadowed, so updates take effect at the next period boundary (no 
+    glitches).
+
+    Note that, like for gpios, the pinmux itself is left to the device tree
+    overlays.
+
+    Methods dict:
+    ======================================================
+
+    config(frequency, duty=0)
+        Frequency in Hz, duty from 0 (always low) to 1 (always high). Can be
+        called again while running.
+
+    set_duty(duty), set_duty_nocheck(duty)
+        Changes the duty cycle. The nocheck version doesn't check the range,
+        or whether the system is running.
+
+    set_frequency(frequency)
+        Changes the frequency, keeping the duty cycle.
+
+    Subclasses need to define mode, register_type, clock_enable (the pwmss
+    clkconfig function), _plan, _setup, _write_period and set_duty_nocheck.
+    '''
+    __slots__ = ('desc', 'system', 'terminal', 'register_name', 
+        'subsystem_name', 'register_map', 'frequency', 'duty', 'counts',
+        '_lock', '_words', '_halfwords')
+
+    def __init__(self, system, terminal):
+        # Doublecheck the terminal can do the mode, and get its deets
+        self.desc = system._resolve_mode.describe(terminal, mode=self.mode)
+
+        self.system = system
+        self.terminal = terminal
+        # ex epwm1 is in pwm_subsystem_1
+        self.register_name = self.desc['register']
+        self.subsystem_name = 'pwm_subsystem_' + self.register_name[-1]
+        # Grab the (shared) description of the registers
+        self.register_map = \
+            system._resolve_register_bits.table(self.register_type)
+        self._lock = system._register_lock(self.register_name)
+
+        self.frequency = None
+        self.duty = 0
+        # Counter ticks per period
+        self.counts = None
+        # Word and halfword views of the block, once started
+        self._words = None
+        self._halfwords = None
+
+        system._generators[terminal] = self
+
+    def __call__(self):
+        return {
+            'on_start': self.on_start,
+            'on_stop': self.on_stop,
+            'config': self.config,
+            'set_duty': self.set_duty,
+            'set_duty_nocheck': self.set_duty_nocheck,
+            'set_frequency': self.set_frequency,
+            'status': self.status}
+
+    def config(self, frequency, duty=0):
+        # Error traps
+        if not 0 <= duty <= 1:
+            raise ValueError('PWM duty must be between 0 and 1.')
+        # Raises ValueError for anything the hardware can't do
+        plan = self._plan(frequency)
+
+        self.frequency = frequency
+        self.duty = duty
+        self.counts = plan[0]
+
+        # If we're running, we also need to reconfigure things
+        if self.system.running:
+            self._write_period(plan)
+            self.set_duty_nocheck(duty)
+
+    def set_frequency(self, frequency):
+        self.config(frequency, self.duty)
+
+    def set_duty(self, duty):
+        if not 0 <= duty <= 1:
+            raise ValueError('PWM duty must be between 0 and 1.')
+        self.duty = duty
+        if self.system.running:
+            self.set_duty_nocheck(duty)
+
+    def status(self):
+        print(self.frequency, self.duty)
+
+    def on_start(self):
+        # Error trap: can't start without a frequency
+        if self.frequency is None:
+            raise RuntimeError('PWM frequency has not been configured.')
+
+        # Clock the whole pwmss, and then our part of it
+        system = self.system
+        system._start_clock(self.subsystem_name)
+        clkconfig = system._resolve_register_bits.table('pwmss')['clkconfig']
+        enable = clkconfig.functions[self.clock_enable]
+        system._modify_register(self.subsystem_name, 
+            system._get_register_view(self.subsystem_name), clkconfig.index,
+            enable.mask, enable.values['enable'])
+
+        self._words = system._get_register_view(self.register_name)
+        self._halfwords = system._get_register_halfwords(self.register_name)
+        self._setup(self._plan(self.frequency))
+
+    def on_stop(self):
+        # Note that the pwm itself keeps going, just like gpio outputs keep 
+        # their level. Set the duty to 0 first to turn it off.
+        self._words = None
+        self._halfwords = None
+
+class _ehrpwm(_pwm):
+    ''' Mode generator for the epwm outputs (A or B) of the PWMSS. Uses a 16
+    bit up-counter, with the prescalers picked for the best resolution. The
+    output goes high at zero, and low at the compare value.
+
+    Note that A and B of the same epwm share the time-base, and therefore 
+    the frequency: configuring one sets it for both.
+    '''
+    mode = 'ehrpwm'
+    register_type = 'epwm'
+    clock_enable = 'epwmclk_en'
+    __slots__ = ('channel', '_compare')
+
+    def __init__(self, system, terminal):
+        # A or B (the sync and tripzone terminals aren't outputs). Check 
+        # before the system hears about us.
+        channel = system._resolve_mode.describe(terminal, 
+            mode=self.mode)['register_detail']
+        if channel not in ('A', 'B'):
+            raise ValueError('Only the A and B outputs of an ehrpwm can be '
+                'used as pins, not ' + channel + '.')
+        super().__init__(system, terminal)
+        self.channel = channel
+        # Halfword index of our compare register
+        self._compare = \
+            self.register_map['cmp' + self.channel.lower()].offset // \
+            _halfword_size
+
+    def config(self, frequency, duty=0):
+        super().config(frequency, duty)
+        # The other channel's compare is relative to the (shared) period, so
+        # it needs redoing
+        for sibling in self._siblings():
+            sibling.frequency = frequency
+            sibling.counts = self.counts
+            if self.system.running:
+                sibling.set_duty_nocheck(sibling.duty)
+
+    def _siblings(self):
+        return [generator for generator in self.system._generators.values()
+            if isinstance(generator, _ehrpwm) and generator is not self and
+            generator.register_name == self.register_name]
+
+    def _plan(self, frequency):
+        ''' Returns (counts, clkdiv, hspclkdiv) for the frequency, with the
+        smallest divider that still fits the 16-bit counter.
+        '''
+        if frequency <= 0:
+            raise ValueError('PWM frequency must be positive.')
+        cycles = _pwm_clock / frequency
+        for divider, clkdiv, hspclkdiv in _epwm_dividers:
+            counts = round(cycles / divider)
+            # Leaves room for a compare of counts (always high) in 16 bits
+            if counts <= 0xFFFF:
+                break
+        else:
+            raise ValueError('PWM frequency is too low for an ehrpwm.')
+        if counts < 2:
+            raise ValueError('PWM frequency is too high for an ehrpwm.')
+        return counts, clkdiv, hspclkdiv
+
+    def _setup(self, plan):
+        system = self.system
+        regs = self._halfwords
+        register_map = self.register_map
+
+        # The time-base clock is gated in the control module. Note that the
+        # control module may ignore writes from user space, in which case 
+        # the overlay (or the kernel's pwm driver) has to have enabled it.
+        tbclken = system._resolve_register_bits.table('control_module')[
+            'pwmss_ctrl']
+        tbclken_bit = tbclken.bits['pwmss' + self.register_name[-1] + 
+            '_tbclken']
+        system._modify_register('control_module', 
+            system._get_register_view('control_module'), tbclken.index, 
+            tbclken_bit.mask, tbclken_bit.mask)
+
+        # Our compare is shadowed and loaded at zero, ...
+        cmpctl = register_map['cmpctl']
+        suffix = self.channel.lower() + 'mode'
+        shadow = cmpctl.functions['shdw' + suffix]
+        load = cmpctl.functions['load' + suffix]
+        system._modify_register(self.register_name, regs, 
+            cmpctl.offset // _halfword_size, shadow.mask | load.mask, 
+            shadow.values['shadow'] | load.values['zero'])
+
+        # ... and the output goes high at zero and low at the compare
+        aqctl = register_map['aqctl' + self.channel.lower()]
+        actions = aqctl.functions
+        regs[aqctl.offset // _halfword_size] = actions['zro'].values['set'] | \
+            actions['c' + self.channel.lower() + 'u'].values['clear']
+
+        self._write_period(plan)
+        self.set_duty_nocheck(self.duty)
+
+    def _write_period(self, plan):
+        counts, clkdiv, hspclkdiv = plan
+        regs = self._halfwords
+        tbctl = self.register_map['tbctl']
+        functions = tbctl.functions
+        bits = tbctl.bits
+
+        # Up-counting, shadowed period, free running, no sync out
+        value = functions['ctrmode'].values['up'] | \
+            functions['prdld'].values['shadow'] | \
+            functions['syncosel'].values['disable'] | \
+            functions['free_soft'].values['free_run'] | \
+            clkdiv << bits['clkdiv'].shift | \
+            hspclkdiv << bits['hspclkdiv'].shift
+        # Shared with the other channel, which also writes it
+        with self._lock:
+            regs[tbctl.offset // _halfword_size] = value
+            regs[self.register_map['tbprd'].offset // _halfword_size] = \
+                counts - 1
+
+    def set_duty_nocheck(self, duty):
+        # Compare of 0 is always low, and of counts (one past the period) is
+        # always high
+        self._halfwords[self._compare] = round(duty * self.counts)
+        self.duty = duty
+
+class _ecap_pwm(_pwm):
+    ''' Mode generator for the ecap modules in APWM mode, ie as another PWM
+    output. Uses a 32 bit counter at the full PWMSS clock, so it covers 
+    anything from well under 1 Hz up. Once started, updates go to the 
+    shadow period and compare registers.
+    '''
+    mode = 'pwm'
+    register_type = 'ecap'
+    clock_enable = 'ecapclk_en'
+    __slots__ = ('_period', '_compare')
+
+    def _plan(self, frequency):
+        if frequency <= 0:
+            raise ValueError('PWM frequency must be positive.')
+        counts = round(_pwm_clock / frequency)
+        if counts > 0xFFFFFFFF:
+            raise ValueError('PWM frequency is too low for an ecap.')
+        if counts < 2:
+            raise ValueError('PWM frequency is too high for an ecap.')
+        return (counts,)
+
+    def _setup(self, plan):
+        register_map = self.register_map
+        ecctl2 = register_map['ecctl2']
+        ecctl2_index = ecctl2.offset // _halfword_size
+        functions = ecctl2.functions
+        apwm = functions['cap_apwm'].values['apwm'] | \
+            functions['synco_sel'].values['disable'] | \
+            functions['apwmpol'].values['active_high']
+
+        # Stop the counter, load the active period and compare, and go
+        self._halfwords[ecctl2_index] = apwm
+        self._period = register_map['cap1'].index
+        self._compare = register_map['cap2'].index
+        self._write_period(plan)
+        self.set_duty_nocheck(self.duty)
+        self._halfwords[ecctl2_index] = apwm | \
+            functions['tsctrstop'].values['run']
+
+        # From here on, use the shadows
+        self._period = register_map['cap3'].index
+        self._compare = register_map['cap4'].index
+
+    def _write_period(self, plan):
+        self._words[self._period] = plan[0] - 1
+
+    def set_duty_nocheck(self, duty):
+        self._words[self._compare] = round(duty * self.counts)
+        self.duty = duty
+
+_mode_generators['ehrpwm'] = _ehrpwm
+_mode_generators['pwm'] = _ecap_pwm
+
+# The McSPI functional clock
+_mcspi_clock = 48000000
+# Each channel's registers (conf, stat, ctrl, tx, rx) repeat this far apart
+_mcspi_channel_stride = 0x14
+# Bytes in each half of the FIFO (it's split between transmit and receive),
+# which is also the size of the DMA-aligned FIFO windows
+_mcspi_fifo_depth = 32
+# XFERLEVEL counts words in 16 bits. Longer transfers go in pieces of this 
+# many bytes (a whole number of FIFO blocks), with chip select held.
+_mcspi_max_piece = 0xFFE0
+
+class _spi():
+    ''' Mode generator for McSPI (SPI master) terminals. The clock and data
+    terminals just need declaring (the pinmux is left to the overlays). The 
+    chip select terminals (cs0, cs1) are the ones that do the talking: each
+    is a channel of its McSPI module, with its own configuration and 
+    transfers.
+
+    Transfers go through the FIFO, a whole block (32 bytes) at a time. With
+    multiple word access, every 32-bit access carries several words, and 
+    with the FIFO DMA-aligned, the FIFO is a 256-bit window that takes a 
+    whole block in one (memoryview) copy, so there's no python per byte. 
+    Transfers on the same module are serialized.
+
+    Methods dict (chip selects only):
+    ======================================================
+
+    config(frequency=1000000, spi_mode=0, bits=8, cs_active='low', 
+            input='d0', timeout=1)
+        SPI clock in Hz (rounded down to what the 48 MHz clock can divide
+        to), SPI mode 0-3 (polarity << 1 | phase; not called mode, so that 
+        it fits in a configure spec), bits per word (8, 16, or
+        32), chip select polarity, which data line is MISO, and how long 
+        (in seconds) to wait on the hardware before TimeoutError.
+
+    transfer(tx, rx=None)
+        Full duplex. Sends tx (any buffer: bytes, bytearray, array, numpy 
+        array...), and if rx is given, fills it with the same number of 
+        received bytes. Multi-byte words are in native (little-endian) 
+        order.
+
+    write(tx)
+        Transmit only.
+
+    readinto(rx)
+        Fills rx, sending zeros. Returns the number of bytes read.
+    '''
+    __slots__ = ('desc', 'system', 'terminal', 'register_name', 'role', 
+        'channel', 'register_map', 'frequency', 'spi_mode', 'bits', 
+        'cs_active', 'input', 'timeout', '_lock', '_regs', '_conf', '_stat',
+        '_ctrl', '_xferlevel', '_conf_value', '_ctrl_value', '_word_bytes',
+        '_tx_window', '_rx_window', '_block', '_block_words', '_zeros')
+
+    def __init__(self, system, terminal):
+        # Doublecheck that the terminal can do spi and get its deets
+        self.desc = system._resolve_mode.describe(terminal, mode='spi')
+        self.system = system
+        self.terminal = terminal
+        self.register_name = self.desc['register']
+        # clk, 0, 1 (data lines), s0, s1 (chip selects)
+        self.role = self.desc['register_detail']
+        self.channel = None
+        if self.role.startswith('s'):
+            self.channel = int(self.role[1:])
+
+        # Grab the (shared) description of the registers
+        self.register_map = system._resolve_register_bits.table('mcspi')
+        # Transfers hold this for the whole module, for as long as they take,
+        # so it's the module's own (shared with its other pins), not one of 
+        # the system's register lock stripes
+        sibling = _find_sibling(system, _spi, self.register_name)
+        if sibling is not None:
+            self._lock = sibling._lock
+        else:
+            self._lock = threading.Lock()
+        self._regs = None
+
+        self.frequency = None
+        # Precomputed register values, from config
+        self._conf_value = None
+        self._ctrl_value = None
+
+        # Scratch for partial blocks, and zeros for readinto
+        self._block = bytearray(_mcspi_fifo_depth)
+        self._block_words = memoryview(self._block).cast(_word_format)
+        self._zeros = memoryview(bytes(_mcspi_fifo_depth)).cast(
+            _word_format)
+
+        system._generators[terminal] = self
+
+    def __call__(self):
+        # The clock and data lines have nothing to do
+        if self.channel is None:
+            return {}
+        return {
+            'on_start': self.on_start,
+            'on_stop': self.on_stop,
+            'config': self.config,
+            'transfer': self.transfer,
+            'write': self.write,
+            'readinto': self.readinto,
+            'status': self.status}
+
+    def config(self, frequency=1000000, spi_mode=0, bits=8, 
+            cs_active='low', input='d0', timeout=1):
+        # Error traps
+        if spi_mode not in (0, 1, 2, 3):
+            raise ValueError('SPI mode must be 0, 1, 2, or 3.')
+        if bits not in (8, 16, 32):
+            raise ValueError('SPI words must be 8, 16, or 32 bits.')
+        if cs_active not in ('low', 'high'):
+            raise ValueError('Chip select must be active "low" or "high".')
+        if input not in ('d0', 'd1'):
+            raise ValueError('SPI input must be "d0" or "d1".')
+        if frequency <= 0:
+            raise ValueError('SPI frequency must be positive.')
+        # One-cycle granularity: divide by anything from 1 to 4096
+        divider = min(max(-(-_mcspi_clock // int(frequency)), 1), 4096)
+
+        conf = self.register_map['ch0conf']
+        bit_fields = conf.bits
+        functions = conf.functions
+        # Transmit on whichever data line isn't the input
+        output = 'd1' if input == 'd0' else 'd0'
+        self._conf_value = (spi_mode & 1) << bit_fields['pha'].shift | \
+            (spi_mode >> 1) << bit_fields['pol'].shift | \
+            ((divider - 1) & 0xF) << bit_fields['clkd'].shift | \
+            (bits - 1) << bit_fields['wl'].shift | \
+            functions['epol'].values['active_' + cs_active] | \
+            functions['is'].values[input] | \
+            functions['dpe' + input[1]].values['none'] | \
+            functions['dpe' + output[1]].values['transmit'] | \
+            functions['clkg'].values['one_cycle']
+        self._ctrl_value = ((divider - 1) >> 4) << \
+            self.register_map['ch0ctrl'].bits['extclk'].shift
+
+        self.frequency = _mcspi_clock / divider
+        self.spi_mode = spi_mode
+        self.bits = bits
+        self.cs_active = cs_active
+        self.input = input
+        self.timeout = timeout
+        self._word_bytes = bits // 8
+
+        # If we're running, we also need to reconfigure things
+        if self._regs is not None:
+            with self._lock:
+                self._regs[self._conf] = self._conf_value
+
+    def status(self):
+        print(self.frequency, self.spi_mode, self.bits)
+
+    def on_start(self):
+        # Error trap
+        if self._conf_value is None:
+            raise RuntimeError('SPI has not been configured.')
+
+        system = self.system
+        register_map = self.register_map
+        system._start_clock(self.register_name)
+        regs = system._get_register_view(self.register_name)
+
+        # Word indices of our channel's registers
+        offset = self.channel * _mcspi_channel_stride
+        self._conf = (register_map['ch0conf'].offset + offset) // _word_size
+        self._stat = (register_map['ch0stat'].offset + offset) // _word_size
+        self._ctrl = (register_map['ch0ctrl'].offset + offset) // _word_size
+        self._xferlevel = register_map['xferlevel'].index
+        # The FIFO windows
+        start = register_map['daftx'].index
+        self._tx_window = regs[start:start + _mcspi_fifo_depth // _word_size]
+        start = register_map['dafrx'].index
+        self._rx_window = regs[start:start + _mcspi_fifo_depth // _word_size]
+
+        # Master, one channel at a time (so chip select can be forced), with
+        # multiple word access through the DMA-aligned FIFO. The other 
+        # channel writes the same thing.
+        functions = register_map['modulctrl'].functions
+        modulctrl = functions['single'].values['single'] | \
+            functions['pin34'].values['cs'] | \
+            functions['ms'].values['master'] | \
+            functions['moa'].values['enable'] | \
+            functions['fdaa'].values['enable']
+        with self._lock:
+            regs[register_map['modulctrl'].index] = modulctrl
+            regs[self._ctrl] = self._ctrl_value
+            regs[self._conf] = self._conf_value
+        self._regs = regs
+
+    def on_stop(self):
+        self._regs = None
+        self._tx_window = None
+        self._rx_window = None
+
+    def transfer(self, tx, rx=None):
+        tx = memoryview(tx).cast('B')
+        if rx is not None:
+            rx = self._writable(rx)
+            if len(rx) != len(tx):
+                raise ValueError('SPI tx and rx must be the same size.')
+        self._run(tx, rx)
+
+    def write(self, tx):
+        self._run(memoryview(tx).cast('B'), None)
+
+    def readinto(self, rx):
+        rx = self._writable(rx)
+        self._run(None, rx)
+        return len(rx)
+
+    @staticmethod
+    def _writable(rx):
+        rx = memoryview(rx).cast('B')
+        if rx.readonly:
+            raise ValueError('SPI rx must be a writable buffer.')
+        return rx
+
+    def _wait(self, mask):
+        ''' Spins until any of the mask's bits are set in our channel's 
+        status.
+        '''
+        regs = self._regs
+        stat = self._stat
+        if regs[stat] & mask:
+            return
+        deadline = time.perf_counter() + self.timeout
+        while not regs[stat] & mask:
+            if time.perf_counter() > deadline:
+                raise TimeoutError('SPI transfer timed out.')
+
+    def _run(self, tx, rx):
+        ''' Transfers tx and/or rx (byte memoryviews, or None), holding chip
+        select for the whole thing.
+        '''
+        # Error traps
+        if self._regs is None:
+            raise RuntimeError('SPI transfers need a running system.')
+        nbytes = len(tx if tx is not None else rx)
+        if nbytes % self._word_bytes:
+            raise ValueError('SPI buffers must be a whole number of ' + 
+                str(self.bits) + '-bit words.')
+        if not nbytes:
+            return
+
+        regs = self._regs
+        functions = self.register_map['ch0conf'].functions
+        conf = self._conf_value | functions['ffew'].values['enable'] | \
+            functions['force'].values['active']
+        if rx is None:
+            conf |= functions['trm'].values['transmit']
+        else:
+            conf |= functions['trm'].values['transmit_receive'] | \
+                functions['ffer'].values['enable']
+
+        with self._lock:
+            regs[self._conf] = conf
+            try:
+                for start in range(0, nbytes, _mcspi_max_piece):
+                    self._piece(tx, rx, start, 
+                        min(start + _mcspi_max_piece, nbytes))
+            finally:
+                # Release chip select, and the FIFO
+                regs[self._conf] = self._conf_value
+
+    def _piece(self, tx, rx, start, end):
+        regs = self._regs
+        stat_bits = self.register_map['ch0stat'].bits
+        txffe = stat_bits['txffe'].mask
+        rxfff = stat_bits['rxfff'].mask
+        eot = stat_bits['eot'].mask
+        enable = self.register_map['ch0ctrl'].functions['en'].values['enable']
+        tx_window = self._tx_window
+        rx_window = self._rx_window
+        block = self._block
+        block_words = self._block_words
+        wait = self._wait
+
+        # Word count, and almost full/empty at a whole block
+        xferlevel = self.register_map['xferlevel'].bits
+        regs[self._xferlevel] = \
+            (end - start) // self._word_bytes << xferlevel['wcnt'].shift | \
+            (_mcspi_fifo_depth - 1) << xferlevel['afl'].shift | \
+            (_mcspi_fifo_depth - 1) << xferlevel['ael'].shift
+
+        regs[self._ctrl] = self._ctrl_value | enable
+        try:
+            for pos in range(start, end, _mcspi_fifo_depth):
+                size = min(_mcspi_fifo_depth, end - pos)
+                words = -(-size // _word_size)
+                last = pos + size == end
+
+                wait(txffe)
+                if tx is None:
+                    tx_window[:words] = self._zeros[:words]
+                elif size == _mcspi_fifo_depth:
+                    tx_window[:] = tx[pos:pos + size].cast(_word_format)
+                # Partial blocks go through the scratch block, so that the
+                # FIFO still only ever sees whole words
+                else:
+                    block[:size] = tx[pos:pos + size]
+                    tx_window[:words] = block_words[:words]
+
+                if rx is not None:
+                    wait(eot if last else rxfff)
+                    if size == _mcspi_fifo_depth:
+                        rx[pos:pos + size].cast(_word_format)[:] = rx_window
+                    else:
+                        block_words[:words] = rx_window[:words]
+                        rx[pos:pos + size] = block[:size]
+            # Nothing to read back, but don't stop before it's all out
+            if rx is None:
+                wait(eot)
+        finally:
+            regs[self._ctrl] = self._ctrl_value
+
+_mode_generators['spi'] = _spi
+
+def _find_sibling(system, generator_class, register_name):
+    ''' Returns a declared generator of the class on the same register block
+    (ex the other pin of a UART), or None. For the modes whose pins share a
+    single peripheral.
+    '''
+    for generator in system._generators.values():
+        if isinstance(generator, generator_class) and \
+                generator.register_name == register_name:
+            return generator
+    return None
+
+# The UART functional clock
+_uart_clock = 48000000
+# Bytes in each of the transmit and receive FIFOs
+_uart_fifo_depth = 64
+# LCR values that expose the configuration registers (dll, dlh, efr...)
+# instead of the operational ones. Mode A is any LCR with div_en set.
+_uart_config_mode_a = 0x80
+_uart_config_mode_b = 0xBF
+# How far off the requested baud rate we're willing to be
+_uart_baud_tolerance = .02
+
+class _uart_port():
+    ''' One UART module, shared by its txd and rxd pins. Received bytes are
+    drained from the RX FIFO into a ring buffer (preallocated by config), 
+    either whenever the port is read from or written to, or continuously 
+    by a background thread. Draining is one C-level loop over the FIFO 
+    (map over the register view), not a python call per byte.
+
+    If the ring fills up, the oldest bytes are dropped to make room, and 
+    counted in dropped.
+    '''
+    __slots__ = ('system', 'register_name', 'register_map', 'baudrate', 
+        'bits', 'parity', 'stop_bits', 'background', 'poll_interval', 
+        'timeout', 'dropped', '_divisor', '_mdr1_value', '_lcr_value', 
+        '_regs', '_ring', '_head', '_tail', '_lock', '_write_lock', 
+        '_thread', '_stopping', '_error')
+
+    def __init__(self, system, register_name):
+        self.system = system
+        self.register_name = register_name
+        # Grab the (shared) description of the registers
+        self.register_map = system._resolve_register_bits.table('uart')
+        self.baudrate = None
+        self.dropped = 0
+        self._regs = None
+        self._ring = None
+        # Total bytes ever put into and taken out of the ring. Their 
+        # difference is what's in it.
+        self._head = 0
+        self._tail = 0
+        # Guards the ring (and the RX FIFO), and the TX FIFO
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopping = None
+        # Whatever killed the background thread
+        self._error = None
+
+    def config(self, baudrate=115200, bits=8, parity=None, stop_bits=1, 
+            buffer_size=4096, background=False, poll_interval=.001, 
+            timeout=1):
+        # Error traps
+        if bits not in (5, 6, 7, 8):
+            raise ValueError('UART characters must be 5 to 8 bits.')
+        if parity not in (None, 'odd', 'even'):
+            raise ValueError('UART parity must be None, "odd", or "even".')
+        if stop_bits not in (1, 2):
+            raise ValueError('UART stop bits must be 1 or 2.')
+        if baudrate <= 0:
+            raise ValueError('UART baud rate must be positive.')
+        if buffer_size < _uart_fifo_depth:
+            raise ValueError('UART buffer must hold at least a whole FIFO ('
+                + str(_uart_fifo_depth) + ' bytes).')
+        if self._thread is not None and not background:
+            raise RuntimeError('Cannot stop the background drain while '
+                'running.')
+        # Whichever of 16x and 13x oversampling gets closest
+        best = None
+        for oversampling, mode in ((16, 'uart16x'), (13, 'uart13x')):
+            divisor = min(max(round(_uart_clock / (oversampling * 
+                baudrate)), 1), 0x3FFF)
+            actual = _uart_clock / (oversampling * divisor)
+            error = abs(actual - baudrate) / baudrate
+            if best is None or error < best[0]:
+                best = (error, actual, divisor, mode)
+        if best[0] > _uart_baud_tolerance:
+            raise ValueError('UART cannot do ' + str(baudrate) + ' baud.')
+        error, actual, self._divisor, mode = best
+
+        register_map = self.register_map
+        self._mdr1_value = \
+            register_map['mdr1'].functions['mode_select'].values[mode]
+        functions = register_map['lcr'].functions
+        lcr = (bits - 5) << register_map['lcr'].bits['char_length'].shift | \
+            functions['nb_stop'].values['one' if stop_bits == 1 else 'two']
+        if parity is not None:
+            lcr |= functions['parity_en'].values['enable'] | \
+                functions['parity_type1'].values[parity]
+        self._lcr_value = lcr
+
+        self.baudrate = actual
+        self.bits = bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        self.background = background
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        with self._lock:
+            if self._ring is None:
+                self._ring = bytearray(buffer_size)
+            elif len(self._ring) != buffer_size:
+                self._resize(buffer_size)
+            # If we're running, we also need to reprogram things
+            running = self._regs is not None
+            if running:
+                self._program()
+        # Turning the background drain on takes effect right away
+        if running and background and self._thread is None:
+            self._start_drain()
+
+    def status(self):
+        print(self.baudrate, self.bits, self.parity, self.stop_bits, 
+            self._head - self._tail, self.dropped)
+
+    def on_start(self):
+        # Both pins start (and stop) the port, so only do it once
+        if self._regs is not None:
+            return
+        # Error trap
+        if self.baudrate is None:
+            raise RuntimeError('UART has not been configured.')
+
+        self.system._start_clock(self.register_name)
+        regs = self.system._get_register_view(self.register_name)
+        register_map = self.register_map
+        sysc = register_map['sysc']
+        # Start from a clean slate
+        regs[sysc.index] = sysc.functions['softreset'].values['reset']
+        self._wait(regs, register_map['syss'].index, 
+            register_map['syss'].bits['resetdone'].mask)
+        regs[sysc.index] = sysc.functions['idlemode'].values['none']
+
+        with self._lock:
+            self._regs = regs
+            self._program()
+            self._head = self._tail = 0
+            self._error = None
+
+        if self.background:
+            self._start_drain()
+
+    def on_stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._regs = None
+
+    def _start_drain(self):
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._drain_loop, 
+            name='hwiopy ' + self.register_name, daemon=True)
+        self._thread.start()
+
+    def _resize(self, size):
+        ''' Swaps in a ring of the given size (with the lock held), keeping 
+        whatever hasn't been read yet. If it doesn't all fit, the oldest 
+        bytes are dropped, same as when draining.
+        '''
+        ring = self._ring
+        old_size = len(ring)
+        pending = self._head - self._tail
+        if pending > size:
+            self.dropped += pending - size
+            self._tail += pending - size
+            pending = size
+        start = self._tail % old_size
+        first = min(pending, old_size - start)
+        new_ring = bytearray(size)
+        new_ring[:first] = ring[start:start + first]
+        new_ring[first:pending] = ring[:pending - first]
+        self._ring = new_ring
+        # Only the difference matters, so start the new ring from zero
+        self._head = pending
+        self._tail = 0
+
+    def _program(self):
+        ''' Sets up the FIFOs, baud rate, and character format, following 
+        the TRM's initialization sequence (with the lock held). Interrupts 
+        stay off: everything is polled.
+        '''
+        regs = self._regs
+        register_map = self.register_map
+        lcr = register_map['lcr'].index
+        # Note that the efr, dll, and dlh share their addresses with other 
+        # registers, and are only there in the configuration modes
+        efr = register_map['efr'].index
+        enhanced = register_map['efr'].functions['enhanced_en'].mask
+        mdr1 = register_map['mdr1'].index
+        fcr = register_map['fcr']
+        mcr = register_map['mcr'].index
+        tcr_tlr = register_map['mcr'].functions['tcr_tlr'].mask
+
+        # Stop the UART while we're at it
+        regs[mdr1] = \
+            register_map['mdr1'].functions['mode_select'].values['disable']
+        regs[lcr] = _uart_config_mode_b
+        efr_saved = regs[efr]
+        regs[efr] = efr_saved | enhanced
+        regs[lcr] = _uart_config_mode_a
+        mcr_saved = regs[mcr]
+        regs[mcr] = mcr_saved | tcr_tlr
+        # FIFOs on (and emptied), with the default trigger levels
+        regs[fcr.index] = fcr.functions['fifo_en'].values['enable'] | \
+            fcr.functions['rx_fifo_clear'].values['clear'] | \
+            fcr.functions['tx_fifo_clear'].values['clear']
+        regs[lcr] = _uart_config_mode_b
+        regs[register_map['tlr'].index] = 0
+        regs[register_map['scr'].index] = 0
+        # Interrupts off
+        regs[lcr] = 0
+        regs[register_map['ier'].index] = 0
+        # Baud rate
+        regs[lcr] = _uart_config_mode_b
+        regs[register_map['dll'].index] = self._divisor & 0xFF
+        regs[register_map['dlh'].index] = self._divisor >> 8
+        regs[efr] = efr_saved & ~enhanced
+        regs[lcr] = _uart_config_mode_a
+        regs[mcr] = mcr_saved & ~tcr_tlr
+        # Character format, which also goes back to operational mode
+        regs[lcr] = self._lcr_value
+        regs[mdr1] = self._mdr1_value
+
+    def _wait(self, regs, index, mask):
+        ''' Spins until any of the mask's bits are set in the register.
+        '''
+        deadline = time.perf_counter() + self.timeout
+        while not regs[index] & mask:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(self.register_name + ' timed out.')
+
+    def drain(self):
+        ''' Moves whatever is in the RX FIFO into the ring. Returns the 
+        number of bytes moved. Only needed for polling by hand (without the 
+        background thread) between reads and writes.
+        '''
+        with self._lock:
+            regs = self._regs
+            if regs is None:
+                raise RuntimeError('UART drains need a running system.')
+            count = regs[self.register_map['rxfifo_lvl'].index] & 0xFF
+            if not count:
+                return 0
+            # One C-level loop: every read of rhr pops the next byte
+            data = bytes(map(regs.__getitem__, 
+                repeat(self.register_map['rhr'].index, count)))
+
+            ring = self._ring
+            size = len(ring)
+            start = self._head % size
+            first = min(count, size - start)
+            ring[start:start + first] = data[:first]
+            ring[:count - first] = data[first:]
+            self._head += count
+            # Drop the oldest to make room
+            overflow = self._head - self._tail - size
+            if overflow > 0:
+                self.dropped += overflow
+                self._tail += overflow
+        return count
+
+    def _drain_loop(self):
+        stopping = self._stopping
+        try:
+            while not stopping.is_set():
+                if not self.drain():
+                    stopping.wait(self.poll_interval)
+        # Handed to whoever reads next
+        except Exception as error:
+            self._error = error
+
+    def readinto(self, buffer):
+        ''' Takes as much as is there (up to the buffer's size) out of the 
+        ring. Never blocks. Returns the number of bytes.
+        '''
+        buffer = memoryview(buffer).cast('B')
+        if buffer.readonly:
+            raise ValueError('UART reads need a writable buffer.')
+        if self._error is not None:
+            raise RuntimeError('The ' + self.register_name + ' background '
+                'drain failed.') from self._error
+        if self._thread is None:
+            self.drain()
+
+        with self._lock:
+            ring = self._ring
+            size = len(ring)
+            count = min(len(buffer), self._head - self._tail)
+            start = self._tail % size
+            first = min(count, size - start)
+            buffer[:first] = ring[start:start + first]
+            buffer[first:count] = ring[:count - first]
+            self._tail += count
+        return count
+
+    def read(self, size=None):
+        ''' Returns (as bytes) whatever is there, or at most size bytes of 
+        it. Never blocks.
+        '''
+        if size is None:
+            size = len(self._ring)
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def write(self, data):
+        ''' Queues all of data (any buffer) for transmission, a FIFO's worth
+        at a time, blocking until the last of it is in the TX FIFO. Returns
+        the number of bytes.
+        '''
+        data = memoryview(data).cast('B')
+        with self._write_lock:
+            regs = self._regs
+            if regs is None:
+                raise RuntimeError('UART writes need a running system.')
+            level = self.register_map['txfifo_lvl'].index
+            thr = self.register_map['thr'].index
+            store = regs.__setitem__
+            position = 0
+            deadline = time.perf_counter() + self.timeout
+            while position < len(data):
+                space = _uart_fifo_depth - (regs[level] & 0xFF)
+                if space > 0:
+                    chunk = data[position:position + space]
+                    # One C-level loop: every write of thr pushes a byte
+                    deque(map(store, repeat(thr, len(chunk)), chunk), 0)
+                    position += len(chunk)
+                    deadline = time.perf_counter() + self.timeout
+                    continue
+                # While we're waiting anyways, don't let the RX FIFO overrun
+                if self._thread is None:
+                    self.drain()
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(self.register_name + ' timed out.')
+        return len(data)
+
+class _uart():
+    ''' Mode generator for UART terminals. The txd and rxd pins of a UART 
+    share the same port (_uart_port), and either one (or both) can be used 
+    to talk to it; configuring either one configures the port. The flow 
+    control terminals (ctsn, rtsn) just need declaring. The pinmux is left
+    to the overlays.
+
+    Methods dict (txd and rxd only):
+    ======================================================
+
+    config(baudrate=115200, bits=8, parity=None, stop_bits=1, 
+            buffer_size=4096, background=False, poll_interval=.001,
+            timeout=1)
+        Baud rate (within 2%, or ValueError), character format, the size of
+        the receive ring buffer, whether a background thread keeps draining
+        the RX FIFO (waking up every poll_interval seconds when there's 
+        nothing to do), and how long (in seconds) writes wait for space.
+
+    readinto(buffer)
+        Fills the buffer with whatever has been received, without blocking.
+        Returns the number of bytes.
+
+    read(size=None)
+        Same, but returns bytes.
+
+    write(data)
+        Transmits any buffer. Returns once it's all in the TX FIFO.
+
+    drain()
+        Moves the RX FIFO into the ring buffer. Reads and writes already do
+        this, but a busy loop without the background thread may need it 
+        too: the FIFO only holds 64 bytes (about 5 ms at 115200 baud).
+    '''
+    __slots__ = ('desc', 'system', 'terminal', 'register_name', 'role', 
+        'port')
+
+    def __init__(self, system, terminal):
+        # Doublecheck that the terminal can do uart and get its deets
+        self.desc = system._resolve_mode.describe(terminal, mode='uart')
+        self.system = system
+        self.terminal = terminal
+        self.register_name = self.desc['register']
+        # txd, rxd, ctsn, rtsn
+        self.role = self.desc['register_detail']
+
+        # Share the port with the other pin, if it's already declared
+        sibling = _find_sibling(system, _uart, self.register_name)
+        if sibling is not None:
+            self.port = sibling.port
+        else:
+            self.port = _uart_port(system, self.register_name)
+
+        system._generators[terminal] = self
+
+    def __call__(self):
+        if self.role not in ('txd', 'rxd'):
+            return {}
+        port = self.port
+        return {
+            'on_start': port.on_start,
+            'on_stop': port.on_stop,
+            'config': port.config,
+            'readinto': port.readinto,
+            'read': port.read,
+            'write': port.write,
+            'drain': port.drain,
+            'status': port.status}
+
+_mode_generators['uart'] = _uart
+
+# The I2C functional clock, and the internal clock it's prescaled to (which
+# is what the TRM's SCL timing is based on)
+_i2c_clock = 48000000
+_i2c_internal_clock = 12000000
+# Bytes in each of the transmit and receive FIFOs
+_i2c_fifo_depth = 32
+
+class _i2c_bus():
+    ''' One I2C module (as master), shared by its scl and sda pins. All of
+    the actual talking is done by I2CBatch.run, with the bus lock held.
+    '''
+    __slots__ = ('system', 'register_name', 'register_map', 'frequency', 
+        'timeout', '_psc', '_scll', '_sclh', '_regs', '_lock')
+
+    def __init__(self, system, register_name):
+        self.system = system
+        self.register_name = register_name
+        # Grab the (shared) description of the registers
+        self.register_map = system._resolve_register_bits.table('i2c')
+        self.frequency = None
+        self._regs = None
+        # Batches run one at a time
+        self._lock = threading.Lock()
+
+    def config(self, frequency=100000, timeout=.1):
+        # Error trap: standard and fast modes only
+        if not 0 < frequency <= 400000:
+            raise ValueError('I2C frequency must be between 23 and 400 kHz.')
+        # SCL low and high times, in internal clock ticks, less the fixed 
+        # overhead the TRM says the module adds to each
+        half_period = round(_i2c_internal_clock / (2 * frequency))
+        scll = half_period - 7
+        sclh = half_period - 5
+        if scll < 0 or scll > 0xFF:
+            raise ValueError('I2C frequency must be between 23 and 400 kHz.')
+
+        self.frequency = _i2c_internal_clock / (2 * half_period)
+        self.timeout = timeout
+        self._psc = _i2c_clock // _i2c_internal_clock - 1
+        self._scll = scll
+        self._sclh = sclh
+
+        # If we're running, we also need to reprogram things
+        if self._regs is not None:
+            with self._lock:
+                self._program()
+
+    def status(self):
+        print(self.frequency)
+
+    def batch(self):
+        return I2CBatch(self)
+
+    def on_start(self):
+        # Both pins start (and stop) the bus, so only do it once
+        if self._regs is not None:
+            return
+        # Error trap
+        if self.frequency is None:
+            raise RuntimeError('I2C has not been configured.')
+
+        self.system._start_clock(self.register_name)
+        regs = self.system._get_register_view(self.register_name)
+        with self._lock:
+            self._regs = regs
+            # Start from a clean slate
+            sysc = self.register_map['sysc']
+            regs[sysc.index] = sysc.functions['srst'].values['reset']
+            self._program()
+
+    def on_stop(self):
+        with self._lock:
+            if self._regs is not None:
+                self._regs[self.register_map['con'].index] = 0
+            self._regs = None
+
+    def _program(self):
+        ''' Sets up the clocks and FIFOs, with the lock held. Interrupts stay
+        off: everything is polled.
+        '''
+        regs = self._regs
+        register_map = self.register_map
+        con = register_map['con']
+        enable = con.functions['i2c_en'].values['enable']
+        # The clocks can only be changed with the module disabled
+        regs[con.index] = 0
+        regs[register_map['psc'].index] = self._psc
+        regs[register_map['scll'].index] = self._scll
+        regs[register_map['sclh'].index] = self._sclh
+        regs[register_map['irqenable_clr'].index] = 0xFFFF
+        # Thresholds at a whole FIFO, so each xrdy is room for a whole 
+        # transaction's worth of writes, and both FIFOs emptied
+        buf = register_map['buf']
+        regs[buf.index] = \
+            (_i2c_fifo_depth - 1) << buf.bits['txtrsh'].shift | \
+            (_i2c_fifo_depth - 1) << buf.bits['rxtrsh'].shift | \
+            buf.functions['txfifo_clr'].values['clear'] | \
+            buf.functions['rxfifo_clr'].values['clear']
+        regs[con.index] = enable
+        # The reset is only done once the module is enabled again
+        syss = register_map['syss']
+        rdone = syss.bits['rdone'].mask
+        deadline = time.perf_counter() + self.timeout
+        while not regs[syss.index] & rdone:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(self.register_name + ' reset timed out.')
+
+class _i2c():
+    ''' Mode generator for I2C terminals. The scl and sda pins of a module 
+    share the same bus (_i2c_bus), and either one (or both) can be used to 
+    talk to it; configuring either one configures the bus. The pinmux 
+    (including the pullups) is left to the overlays.
+
+    Methods dict:
+    ======================================================
+
+    config(frequency=100000, timeout=.1)
+        SCL frequency in Hz (standard or fast mode, up to 400 kHz), and how
+        long (in seconds) to wait on the bus before TimeoutError.
+
+    batch()
+        Returns a new, empty I2CBatch for the bus. Queue up register reads
+        and writes on it once, and then run it as often as needed.
+    '''
+    __slots__ = ('desc', 'system', 'terminal', 'register_name', 'role', 
+        'bus')
+
+    def __init__(self, system, terminal):
+        # Doublecheck that the terminal can do i2c and get its deets
+        self.desc = system._resolve_mode.describe(terminal, mode='i2c')
+        self.system = system
+        self.terminal = terminal
+        self.register_name = self.desc['register']
+        # scl, sda
+        self.role = self.desc['register_detail']
+
+        # Share the bus with the other pin, if it's already declared
+        sibling = _find_sibling(system, _i2c, self.register_name)
+        if sibling is not None:
+            self.bus = sibling.bus
+        else:
+            self.bus = _i2c_bus(system, self.register_name)
+
+        system._generators[terminal] = self
+
+    def __call__(self):
+        bus = self.bus
+        return {
+            'on_start': bus.on_start,
+            'on_stop': bus.on_stop,
+            'config': bus.config,
+            'batch': bus.batch,
+            'status': bus.status}
+
+_mode_generators['i2c'] = _i2c
+
+class I2CBatch():
+    ''' A queue of I2C device register reads and writes, run as one 
+    sequence of transactions with the bus held. Everything that doesn't 
+    change between runs (register values, payloads, where each read goes) is
+    worked out once, when the batch is first run after being changed, and 
+    every read lands in the same preallocated results buffer. Each 
+    transaction's bytes go through the FIFOs in one burst, so a run costs a 
+    handful of register accesses per transaction, whatever the byte count.
+
+    Every transaction is a complete one (start to stop), and reads are the
+    usual write-the-register-address, repeated start, read. Payloads and 
+    reads are limited to a FIFO's worth (32 bytes, including the register 
+    address for writes).
+
+        batch = pin.methods['batch']()
+        temperature = batch.read(0x48, 0x00, 2)
+        batch.write(0x48, 0x01, b'\\x60')
+        results = batch.run()
+        results[temperature]
+
+    I2CBatch.write(address, register, data), I2CBatch.read(address, 
+    register, count=1):
+    ======================================================
+
+    address             int             7-bit device address
+    register            int             device register (one byte)
+    data                int or buffer   byte(s) to write to it
+    count               int             bytes to read from it
+
+    read returns a slice of the results for that read.
+
+    I2CBatch.run():
+    ======================================================
+
+    Runs everything, in order. The system must be running. Raises 
+    RuntimeError on a missing acknowledge or lost arbitration (after 
+    releasing the bus), and TimeoutError if the bus doesn't respond.
+
+    return
+    ------------------------------------------------------
+
+    bytearray           results, the same object every run
+    '''
+    def __init__(self, bus):
+        self.bus = bus
+        # (address, register, payload bytes or None, count)
+        self._queue = []
+        self._plan = None
+        self.results = bytearray()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def write(self, address, register, data):
+        if isinstance(data, int):
+            data = bytes((data,))
+        data = bytes(data)
+        if len(data) + 1 > _i2c_fifo_depth:
+            raise ValueError('I2C writes are limited to ' + 
+                str(_i2c_fifo_depth - 1) + ' bytes.')
+        self._check(address, register)
+        self._queue.append((address, register, data, 0))
+        self._plan = None
+
+    def read(self, address, register, count=1):
+        if not 1 <= count <= _i2c_fifo_depth:
+            raise ValueError('I2C reads must be 1 to ' + 
+                str(_i2c_fifo_depth) + ' bytes.')
+        self._check(address, register)
+        start = sum(entry[3] for entry in self._queue)
+        self._queue.append((address, register, None, count))
+        self._plan = None
+        return slice(start, start + count)
+
+    @staticmethod
+    def _check(address, register):
+        if not 0 <= address <= 0x7F:
+            raise ValueError('I2C addresses must be 7-bit.')
+        if not 0 <= register <= 0xFF:
+            raise ValueError('I2C device registers must be one byte.')
+
+    def _compile(self):
+        register_map = self.bus.register_map
+        functions = register_map['con'].functions
+        base = functions['i2c_en'].values['enable'] | \
+            functions['mst'].values['master'] | \
+            functions['stt'].values['start']
+        transmit = functions['trx'].values['transmit']
+        stop = functions['stp'].values['stop']
+
+        # (address, transmit con, transmit bytes, receive con, results 
+        # start, results end)
+        plan = []
+        position = 0
+        for address, register, data, count in self._queue:
+            if data is not None:
+                plan.append((address, base | transmit | stop, 
+                    bytes((register,)) + data, None, 0, 0))
+            else:
+                # No stop after the address: repeated start instead
+                plan.append((address, base | transmit, bytes((register,)), 
+                    base | stop, position, position + count))
+                position += count
+        self.results = bytearray(position)
+        self._plan = tuple(plan)
+
+    def run(self):
+        if self._plan is None:
+            self._compile()
+        bus = self.bus
+        register_map = bus.register_map
+        irq_bits = register_map['irqstatus_raw'].bits
+        ardy = irq_bits['ardy'].mask
+        xrdy = irq_bits['xrdy'].mask
+        rrdy = irq_bits['rrdy'].mask
+        rdr = irq_bits['rdr'].mask
+        bb = irq_bits['bb'].mask
+        failed = irq_bits['nack'].mask | irq_bits['al'].mask
+        raw = register_map['irqstatus_raw'].index
+        clear = register_map['irqstatus'].index
+        sa = register_map['sa'].index
+        cnt = register_map['cnt'].index
+        con = register_map['con'].index
+        fifo = register_map['data'].index
+        bufstat = register_map['bufstat'].index
+        rxstat = register_map['bufstat'].bits['rxstat']
+        results = memoryview(self.results)
+        timeout = bus.timeout
+        perf_counter = time.perf_counter
+
+        def wait(mask):
+            ''' Returns the status once any of the mask's bits (or a 
+            failure) are set.
+            '''
+            status = regs[raw]
+            if status & (mask | failed):
+                return status
+            deadline = perf_counter() + timeout
+            while not status & (mask | failed):
+                if perf_counter() > deadline:
+                    raise TimeoutError(bus.register_name + ' timed out.')
+                status = regs[raw]
+            return status
+
+        with bus._lock:
+            regs = bus._regs
+            if regs is None:
+                raise RuntimeError('I2C batches need a running system.')
+            store = regs.__setitem__
+            load = regs.__getitem__
+            for address, send_con, payload, receive_con, start, end in \
+                    self._plan:
+                # Previous transaction's stop needs to be through
+                if regs[raw] & bb:
+                    deadline = perf_counter() + timeout
+                    while regs[raw] & bb:
+                        if perf_counter() > deadline:
+                            raise TimeoutError(bus.register_name + 
+                                ' is busy.')
+                regs[sa] = address
+                regs[cnt] = len(payload)
+                regs[con] = send_con
+                status = wait(xrdy)
+                if status & failed:
+                    self._fail(status, address)
+                # One C-level loop for the whole payload
+                deque(map(store, repeat(fifo, len(payload)), payload), 0)
+                regs[clear] = xrdy
+                status = wait(ardy)
+                if status & failed:
+                    self._fail(status, address)
+                regs[clear] = ardy
+                if receive_con is None:
+                    continue
+
+                regs[cnt] = end - start
+                regs[con] = receive_con
+                position = start
+                while True:
+                    status = wait(ardy | rrdy | rdr)
+                    if status & failed:
+                        self._fail(status, address)
+                    count = min((regs[bufstat] & rxstat.mask) >> 
+                        rxstat.shift, end - position)
+                    if count:
+                        results[position:position + count] = bytes(map(
+                            load, repeat(fifo, count)))
+                        position += count
+                    regs[clear] = status & (ardy | rrdy | rdr)
+                    if status & ardy:
+                        break
+        return self.results
+
+    def _fail(self, status, address):
+        ''' Releases the bus after a failed transaction, and raises. With the
+        bus lock held.
+        '''
+        bus = self.bus
+        register_map = bus.register_map
+        con = register_map['con'].index
+        regs = bus._regs
+        regs[con] = regs[con] | \
+            register_map['con'].functions['stp'].values['stop']
+        regs[register_map['irqstatus'].index] = 0xFFFF
+        if status & register_map['irqstatus_raw'].bits['al'].mask:
+            raise RuntimeError(bus.register_name + ' lost arbitration.')
+        raise RuntimeError(bus.register_name + ': no acknowledge from ' + 
+            hex(address) + '.')
+
+# The ADC's clock (the 24 MHz master oscillator on the beaglebone), and the
+# fastest the ADC itself may be clocked at
+_adc_clock = 24000000
+_adc_max_clock = 3000000
+# ADC clocks per sample, after the open delay: one to sample (with a sample
+# delay of 0) and thirteen to convert
+_adc_sample_clocks = 14
+_adc_max_open_delay = 0x3FFFF
+# Words in each FIFO
+_adc_fifo_depth = 64
+_adc_averaging = {1: 'none', 2: 'two', 4: 'four', 8: 'eight', 16: 'sixteen'}
+
+class _adc_sampler():
+    ''' The TSC_ADC, shared by every ain pin. Starting the system programs 
+    one sequencer step per declared channel (in channel order), in 
+    continuous mode. Captures then run the sequencer and drain its FIFO 
+    into the output buffer: one C-level loop per FIFO's worth (up to 64 
+    samples), not a python call per sample. Samples are interleaved by 
+    channel, just like Sitara335.capture interleaves banks.
+
+    If the FIFO overruns (python fell behind), samples are lost and the 
+    interleaving would be off, so that's a RuntimeError.
+    '''
+    __slots__ = ('system', 'register_name', 'register_map', 'rate', 
+        'actual_rate', 'averaging', 'timeout', 'channels', '_clkdiv', 
+        '_open_delay', '_regs', '_lock')
+
+    def __init__(self, system, register_name):
+        self.system = system
+        self.register_name = register_name
+        # Grab the (shared) description of the registers
+        self.register_map = system._resolve_register_bits.table('adc_tsc')
+        # As requested, and as close as the ADC gets to it (once started)
+        self.rate = None
+        self.actual_rate = None
+        self.channels = ()
+        self.timeout = 1
+        self._regs = None
+        # Captures and streams run one at a time
+        self._lock = threading.Lock()
+
+    def config(self, rate=1000, averaging=1, timeout=1):
+        # Error traps
+        if averaging not in _adc_averaging:
+            raise ValueError('ADC averaging must be 1, 2, 4, 8, or 16.')
+        if rate <= 0:
+            raise ValueError('ADC rate must be positive.')
+        self.rate = rate
+        self.averaging = averaging
+        self.timeout = timeout
+        # The channels may not all be declared yet, so the timing is worked 
+        # out when starting (but checked now, for however many there are)
+        self._plan(max(len(self._declared()), 1))
+
+    def _declared(self):
+        ''' Returns the channels of every declared ain pin, in order.
+        '''
+        return tuple(sorted({generator.channel for generator in 
+            self.system._generators.values() if isinstance(generator, _ain)
+            and generator.sampler is self}))
+
+    def _plan(self, count):
+        ''' Returns (clkdiv, open delay, actual rate) for sampling count 
+        channels at the rate. The ADC is clocked as fast as it may be, and 
+        then the open delay before each step pads it out to the rate.
+        '''
+        # In ADC input clocks
+        per_step = _adc_clock / (self.rate * count)
+        busy = self.averaging * _adc_sample_clocks
+        clkdiv = max(_adc_clock // _adc_max_clock, 
+            -(-int(per_step) // (_adc_max_open_delay + busy))) - 1
+        open_delay = round(per_step / (clkdiv + 1)) - busy
+        if open_delay < 0 or clkdiv > 0xFFFF:
+            raise ValueError('ADC cannot sample ' + str(count) + 
+                ' channel(s) at ' + str(self.rate) + ' Hz.')
+        actual = _adc_clock / (clkdiv + 1) / ((open_delay + busy) * count)
+        return clkdiv, open_delay, actual
+
+    def status(self):
+        print(self.rate, self.actual_rate, self.averaging, self.channels)
+
+    def on_start(self):
+        # Every ain pin starts (and stops) the sampler, so only do it once
+        if self._regs is not None:
+            return
+        # Error trap
+        if self.rate is None:
+            raise RuntimeError('ADC has not been configured.')
+
+        self.channels = self._declared()
+        clkdiv, open_delay, self.actual_rate = \
+            self._plan(len(self.channels))
+        self.system._start_clock(self.register_name)
+        regs = self.system._get_register_view(self.register_name)
+        register_map = self.register_map
+
+        ctrl = register_map['ctrl']
+        regs[ctrl.index] = ctrl.functions['stepconfig_writeprotect_n'].\
+            values['writable']
+        regs[register_map['stepenable'].index] = 0
+        regs[register_map['irqenable_clr'].index] = 0x7FF
+        regs[register_map['adc_clkdiv'].index] = clkdiv
+        # One step per channel, single ended (against the ADC's reference),
+        # into fifo0
+        for step, channel in enumerate(self.channels, 1):
+            config = register_map['stepconfig' + str(step)]
+            functions = config.functions
+            regs[config.index] = \
+                functions['mode'].values['sw_continuous'] | \
+                functions['averaging'].values[_adc_averaging[
+                    self.averaging]] | \
+                functions['fifo_select'].values['fifo0'] | \
+                channel << config.bits['sel_inp_swc'].shift | \
+                8 << config.bits['sel_inm_swm'].shift
+            regs[register_map['stepdelay' + str(step)].index] = open_delay
+        # Steps stay protected while the module's enabled
+        regs[ctrl.index] = 0
+        self._regs = regs
+
+    def on_stop(self):
+        # Not under the lock: a suspended stream could be holding it
+        regs = self._regs
+        if regs is None:
+            return
+        self._regs = None
+        # Don't leave an abandoned stream's sequencer running
+        ctrl = self.register_map['ctrl']
+        if regs[ctrl.index] & ctrl.functions['enable'].mask:
+            self._halt(regs)
+
+    def _run(self, regs):
+        ''' Empties the FIFO and starts the sequencer, from the first step.
+        '''
+        register_map = self.register_map
+        self._flush(regs)
+        regs[register_map['irqstatus'].index] = 0x7FF
+        regs[register_map['stepenable'].index] = \
+            ((1 << len(self.channels)) - 1) << \
+            register_map['stepenable'].bits['steps'].shift
+        regs[register_map['ctrl'].index] = \
+            register_map['ctrl'].functions['enable'].values['enable']
+
+    def _halt(self, regs):
+        register_map = self.register_map
+        regs[register_map['ctrl'].index] = 0
+        regs[register_map['stepenable'].index] = 0
+        self._flush(regs)
+
+    def _flush(self, regs):
+        count = regs[self.register_map['fifo0count'].index] & 0x7F
+        fifo = self.register_map['fifo0data'].index
+        deque(map(regs.__getitem__, repeat(fifo, count)), 0)
+
+    def _fill(self, regs, words, start, end):
+        ''' Drains the (running) sequencer into words[start:end].
+        '''
+        register_map = self.register_map
+        count_index = register_map['fifo0count'].index
+        fifo = register_map['fifo0data'].index
+        raw = register_map['irqstatus_raw'].index
+        overrun = register_map['irqstatus_raw'].bits['fifo0_overrun'].mask
+        load = regs.__getitem__
+        perf_counter = time.perf_counter
+        timeout = self.timeout
+
+        position = start
+        deadline = perf_counter() + timeout
+        while position < end:
+            count = min(regs[count_index] & 0x7F, end - position)
+            if count:
+                # One C-level loop: every read of the fifo pops a sample
+                words[position:position + count] = array(_word_format, 
+                    map(load, repeat(fifo, count)))
+                position += count
+                if regs[raw] & overrun:
+                    raise RuntimeError('ADC FIFO overrun: samples were '
+                        'lost. Lower the rate, or read faster.')
+                deadline = perf_counter() + timeout
+            elif perf_counter() > deadline:
+                raise TimeoutError('ADC sequencer timed out.')
+
+    def _words(self, out, count):
+        ''' Returns the output buffer (allocating one if out is None), and a
+        writable word view of its first count items.
+        '''
+        if out is None:
+            out = array(_word_format, bytes(_word_size * count))
+        words = _as_words(out)
+        # Error traps: _as_words copies anything that isn't a proper buffer
+        if not isinstance(words, memoryview) or words.readonly:
+            raise ValueError('ADC output must be a writable buffer of 32-bit'
+                ' items, ex array("I") or a uint32 numpy array.')
+        if len(words) < count:
+            raise ValueError('Output buffer too small for ' + str(count) +
+                ' samples.')
+        return out, words
+
+    def capture(self, count, out=None):
+        ''' Samples every channel count times, into out (or a new array('I')
+        if out is None), and returns it. Sample n of channel c (the c-th in
+        self.channels) ends up in out[n * len(channels) + c].
+        '''
+        total = count * len(self.channels)
+        out, words = self._words(out, total)
+        regs = self._acquire()
+        try:
+            self._run(regs)
+            try:
+                self._fill(regs, words, 0, total)
+            finally:
+                self._halt(regs)
+        finally:
+            self._lock.release()
+        return out
+
+    def stream(self, count, chunks=None, out=None):
+        ''' Generator for long (or endless) acquisitions. Keeps the 
+        sequencer running, and yields count samples of every channel at a 
+        time, interleaved as for capture, chunks times (or forever, if 
+        chunks is None). Every chunk is the same buffer (out, or a new 
+        array('I')), so copy it if you need to keep it. The FIFO only holds 
+        64 samples, so whatever you do with each chunk needs to be quick.
+        '''
+        total = count * len(self.channels)
+        out, words = self._words(out, total)
+        regs = self._acquire()
+        try:
+            self._run(regs)
+            chunk = 0
+            while chunks is None or chunk < chunks:
+                # The system may have been stopped while we were suspended
+                if self._regs is not regs:
+                    raise RuntimeError('ADC stream outlived its system.')
+                self._fill(regs, words, 0, total)
+                yield out
+                chunk += 1
+        finally:
+            if self._regs is regs:
+                self._halt(regs)
+            self._lock.release()
+
+    def _acquire(self):
+        ''' Takes the ADC for a capture or stream, and returns the register
+        view. A stream holds it for as long as it runs (including while 
+        suspended), so this can't just wait forever.
+        '''
+        if not self._lock.acquire(timeout=self.timeout):
+            raise RuntimeError('ADC is busy with another capture or '
+                'stream.')
+        regs = self._regs
+        if regs is None:
+            self._lock.release()
+            raise RuntimeError('ADC captures need a running system.')
+        return regs
+
+    def demux(self, samples):
+        ''' Splits captured (or streamed) samples by channel. Returns 
+        {channel: samples}, see demux_analog.
+        '''
+        return dict(zip(self.channels, 
+            demux_analog(samples, len(self.channels))))
+
+    def read_channel(self, channel):
+        ''' Returns a single sample of the channel (0 to 4095, for 0 to 
+        1.8 V). Runs a whole sequence to get it.
+        '''
+        return self.capture(1)[self.channels.index(channel)]
+
+class _ain():
+    ''' Mode generator for analog in terminals. Every ain pin shares the 
+    (single) ADC, so configuring any one of them configures all of them, and
+    captures sample every declared channel together. Note that the ADC 
+    inputs take 0 to 1.8 V, and nothing more.
+
+    Methods dict:
+    ======================================================
+
+    config(rate=1000, averaging=1, timeout=1)
+        Sequences per second (every channel is sampled once per sequence; 
+        the actual rate is as close as the ADC's clock allows, and ends up
+        in the sampler's actual_rate once started), hardware averaging per
+        sample (1, 2, 4, 8, or 16), and how long (in seconds) to wait on 
+        the sequencer before TimeoutError.
+
+    read()
+        One sample of this pin's channel.
+
+    capture(count, out=None)
+        count samples of every channel, interleaved by channel, into out (a
+        preallocated array('I') or uint32 numpy array with room for count *
+        channels samples), or a new array('I').
+
+    stream(count, chunks=None, out=None)
+        Generator, yielding count samples of every channel at a time 
+        (always in the same buffer), without stopping the sampling in 
+        between. Forever, if chunks is None.
+
+    demux(samples)
+        {channel: samples of that channel}, done with slicing (so, for 
+        numpy, views) instead of sample by sample.
+    '''
+    __slots__ = ('desc', 'system', 'terminal', 'register_name', 'channel', 
+        'sampler')
+
+    def __init__(self, system, terminal):
+        # Doublecheck that the terminal can do ain and get its deets
+        self.desc = system._resolve_mode.describe(terminal, mode='ain')
+        self.system = system
+        self.terminal = terminal
+        self.register_name = self.desc['register']
+        # AIN0 through AIN7
+        self.channel = int(self.desc['register_detail'])
+
+        # Every ain pin shares the one ADC
+        sibling = _find_sibling(system, _ain, self.register_name)
+        if sibling is not None:
+            self.sampler = sibling.sampler
+        else:
+            self.sampler = _adc_sampler(system, self.register_name)
+
+        system._generators[terminal] = self
+
+    def __call__(self):
+        sampler = self.sampler
+        return {
+            'on_start': sampler.on_start,
+            'on_stop': sampler.on_stop,
+            'config': sampler.config,
+            'read': partial(sampler.read_channel, self.channel),
+            'capture': sampler.capture,
+            'stream': sampler.stream,
+            'demux': sampler.demux,
+            'status': sampler.status}
+
+_mode_generators['ain'] = _ain
+
+def _mode_not_implemented(*args, **kwargs):
     raise NotImplementedError('This package does not yet support that '
-        'mode on the cortex A8 chipset.')
\ No newline at end of file
+        'mode on the cortex A8 chipset.')
@@ -28,9 +28,17 @@ hwiopy: A common API for hardware input/output access.
 Something something sooooomething goes here.
 '''
 # Global dependencies
-import subprocess, tempfile, json
+import os, subprocess, hashlib, json
 from subprocess import CalledProcessError
-from pkg_resources import resource_filename, resource_string
+from concurrent.futures import ThreadPoolExecutor
+
+# This file sits next to the hwiopy package (it's run by setup.py, before
+# hwiopy is installed)
+_package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
+    'hwiopy')
+
+def _package_file(resource):
+    return os.path.join(_package_dir, *resource.split('/'))
 
 class bbb_setup():
     ''' Performs installation setup for a Beaglebone Black.
@@ -38,18 +46,55 @@ class bbb_setup():
     Basically using this as a local namsepace container so that all platform 
     setup files can be contained within this file. Flat is better than nested
     and all that.
+
+    Every overlay is compiled in parallel (dtc is a subprocess, so threads 
+    will do). Overlays are cached: each one is keyed by a hash of its dts 
+    (which is the template plus its parameters) and the dtc command, stored
+    in the overlays directory's manifest, and only rebuilt when that 
+    changes or its dtbo has gone missing.
+
+    bbb_setup():
+    ======================================================
+
+    *args
+    ------------------------------------------------------
+
+    dtc=None            str             dtc executable to use. If None, 
+                                        checks the system dtc, falling back 
+                                        to the included bbb_dtc.sh
+    overlays_dir=None   str             Where to put the .dts and .dtbo files.
+                                        Defaults to hwiopy/overlays.
+    workers=None        int             Parallel dtc calls, default cpu count
+    force=False         bool            Rebuild everything, cached or not
+
+    local namespace
+    ------------------------------------------------------
+
+    built               list            ['overlay name', ...] compiled
+    skipped             list            ['overlay name', ...] up to date
     '''
+    # Maybe define this elsewhere?
+    version = '00A0'
+    # Remembers the hash each overlay was built from
+    manifest_name = 'hwiopy-overlays.json'
 
-    def __init__(self):
+    def __init__(self, dtc=None, overlays_dir=None, workers=None, 
+            force=False):
         ''' Handles all of the prerequisites we need to actually set up the
         beaglebone black.
         '''
+        if overlays_dir is None:
+            overlays_dir = _package_file('overlays')
+        self._overlays_dir = overlays_dir
+        os.makedirs(overlays_dir, exist_ok=True)
+
+        if dtc is not None:
+            self._dtc_string = dtc
         # Verify that dtc can be used. If not, install it. Then we can just 
         # do a subprocess.check_call([self._dtc_string, ...])
-        if not self._check_dtc():
+        elif not self._check_dtc():
             # Declare the self dtc string as the included bbb_dtc.sh
-            self._dtc_string = \
-                resource_filename('hwiopy', 'setup_utils/bbb_dtc.sh')
+            self._dtc_string = _package_file('setup_utils/bbb_dtc.sh')
 
             # Make the included dtc.sh executable
             subprocess.check_call(['chmod', '+x', self._dtc_string])
@@ -59,9 +104,15 @@ class bbb_setup():
 
         # Okay, now we need to compile dtbos
         # Get the description from the mapping file
-        sitara_description = json.loads(resource_string('hwiopy', 
-            'maps/sitara_termmodes.json').decode('utf-8'))
-
+        with open(_package_file('maps/sitara_termmodes.json'), 'r') as f:
+            sitara_description = json.load(f)
+        # Every overlay uses the same template, so only read it once
+        with open(_package_file('overlays/bbb_template_gpio.dts'), 'r') as f:
+            template = f.read()
+
+        # Build every dts up front (that's cheap)
+        # {name: dts}
+        overlays = {}
         # Iterate over every SoC terminal
         for terminal_name, terminal_dict in sitara_description.items():
             # Create a list of every available mode for the terminal
@@ -78,16 +129,85 @@ class bbb_setup():
                 control = hex(int(terminal_dict['mux_default'], 16))
 
                 # Build a dts for it
-                self._build_dts(desc, name, offset, control)
-                self._compile_dts(name)
+                overlays[name] = self._build_dts(template, desc, name, 
+                    offset, control)
+
+        # Figure out which ones actually need compiling
+        manifest = {} if force else self._load_manifest()
+        hashes = {name: self._hash(dts) for name, dts in overlays.items()}
+        stale = [name for name in overlays if force or 
+            manifest.get(name) != hashes[name] or 
+            not os.path.exists(self._filename(name, '.dtbo'))]
+        self.skipped = [name for name in overlays if name not in stale]
+        self.built = []
+
+        # And now the slow part
+        failure = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(self._compile_overlay, name, 
+                overlays[name]) for name in stale}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as exc:
+                    # Keep going, so the manifest still gets everything that
+                    # did work. Forget whatever this one was before, though.
+                    manifest.pop(name, None)
+                    if failure is None:
+                        failure = exc
+                else:
+                    manifest[name] = hashes[name]
+                    self.built.append(name)
+
+        self._save_manifest(manifest)
+        if failure is not None:
+            raise failure
 
     @classmethod
-    def do(cls):
-        self = cls()
+    def do(cls, **kwargs):
+        self = cls(**kwargs)
+
+    def _filename(self, name, extension):
+        return os.path.join(self._overlays_dir, name + '-' + self.version + 
+            extension)
 
-    @staticmethod
-    def _build_dts(description, name, offset, control, pin=None, device=None):
-        ''' 
+    def _hash(self, dts):
+        ''' The cache key for an overlay: its dts (which covers the 
+        template and every parameter), and how it's compiled.
+        '''
+        digest = hashlib.sha1(dts.encode('utf-8'))
+        digest.update(repr((self.version, self._dtc_string)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self._overlays_dir, self.manifest_name), 
+                    'r') as f:
+                return json.load(f)
+        # No manifest (or a broken one) means nothing is cached
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self._overlays_dir, self.manifest_name)
+        # Write to a temporary file first, so a crash can't leave a half-
+        # written manifest claiming overlays are up to date
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def _compile_overlay(self, name, dts):
+        ''' Writes out and compiles a single overlay. Runs in the pool.
+        '''
+        with open(self._filename(name, '.dts'), 'w') as dts_file:
+            dts_file.write(dts)
+        self._compile_dts(name)
+
+    def _build_dts(self, template, description, name, offset, control, 
+            pin=None, device=None):
+        ''' Returns the text of the dts.
+
+        template: the overlay template's text.
         description: the overlay description.
         name: the overlay name.
         offset: the register offset address for the SoC terminal.
@@ -152,39 +272,22 @@ class bbb_setup():
 
         Note: I hear that PWM overlay generation works differently?
         '''
-        # Maybe define this elsewhere?
-        version = '00A0'
-
-        # Define the header
-        template = \
-            resource_string('hwiopy', 'overlays/bbb_template_gpio.dts').\
-            decode()
-
         # Make a name that contains no dashes
         safename = name.replace('-', '_')
 
         # Replace applicable fields in the template
         dts = template.replace('__NAME__', name)
         dts = dts.replace('__DESCRIPTION__', description)
-        dts = dts.replace('__VERSION__', version)
+        dts = dts.replace('__VERSION__', self.version)
         dts = dts.replace('__SAFENAME__', safename)
         dts = dts.replace('__OFFSET__', offset)
         dts = dts.replace('__PINCONTROL__', control)
-
-        # Output the dts
-        dts_filename = resource_filename('hwiopy', 'overlays') + '/' + name +\
-            '-' + version + '.dts'
-        with open(dts_filename, 'w+') as dts_file:
-            dts_file.write(dts)
+        return dts
 
     def _compile_dts(self, name):
-        # Maybe define this elsewhere?
-        version = '00A0'
-
         # Get the before and after filenames
-        overlays_path = resource_filename('hwiopy', 'overlays') + '/'
-        dts_filename = overlays_path + name + '-' + version + '.dts'
-        dtbo_filename = overlays_path + name + '-' + version + '.dtbo'
+        dts_filename = self._filename(name, '.dts')
+        dtbo_filename = self._filename(name, '.dtbo')
 
         # Make the system call
         subprocess.check_call([self._dtc_string, '-O', 'dtb', '-o', 
@@ -196,8 +299,8 @@ class bbb_setup():
         https://raw.github.com/RobertCNelson/tools/master/pkgs/dtc.sh
         '''
         # Get the filenames for the relevant files
-        test_overlay = resource_filename('hwiopy', 'overlays/test.dts')
-        test_compiled = resource_filename('hwiopy', 'overlays') + '/test.dtbo'
+        test_overlay = _package_file('overlays/test.dts')
+        test_compiled = os.path.join(self._overlays_dir, 'test.dtbo')
 
         try:
             # Try using the system dtc on the example device tree
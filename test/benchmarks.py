@@ -0,0 +1,261 @@
+''' Benchmark suite for hwiopy. Doesn't need a beaglebone (or root): by
+default everything runs against a sparse file standing in for /dev/mem,
+in shared memory when there is some. Results are printed, and optionally
+saved as JSON, which can then be used as the baseline for a later run:
+
+    python3 test/benchmarks.py --json baseline.json
+    (change things)
+    python3 test/benchmarks.py --compare baseline.json
+
+Comparing exits with status 1 if anything got slower than the tolerance.
+Pass --mem-filename /dev/mem on a real beaglebone to measure the real thing
+(the gpio registers are then really driven, so mind what's on header P8).
+
+Every timing is the best of several runs, timeit-style, in seconds per
+operation (one register write, one read, one sample...). The memory
+benchmarks are in bytes, as seen by tracemalloc.
+'''
+
+import argparse, json, os, platform, subprocess, sys, tempfile, time, timeit
+import gc, tracemalloc, warnings
+from array import array
+
+# Make sure we're benchmarking this checkout, not some installed hwiopy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import hwiopy
+
+# Pins in bank gpio2 (0x481AC000), channels 2 through 5
+bank_pins = ['8_7', '8_8', '8_9', '8_10']
+
+# name: callable(memfile name, scale) -> seconds per operation (or bytes)
+benchmarks = {}
+# Names of the benchmarks that measure bytes instead of seconds
+memory_benchmarks = set()
+
+def benchmark(func):
+    benchmarks[func.__name__] = func
+    return func
+
+def memory_benchmark(func):
+    memory_benchmarks.add(func.__name__)
+    return benchmark(func)
+
+def best_of(stmt, number, repeat=5, ops=1, setup='pass', namespace=None):
+    ''' Times stmt, number times per run, and returns the best run's time
+    per op.
+    '''
+    timer = timeit.Timer(stmt, setup=setup, globals=namespace)
+    return min(timer.repeat(repeat, number)) / (number * ops)
+
+def make_device(mem_filename, direction='out'):
+    bbb = hwiopy.platforms.BBB(mem_filename=mem_filename)
+    pins = [bbb.create_pin(pin_num, 'gpio') for pin_num in bank_pins]
+    for pin in pins:
+        pin.config(direction)
+    return bbb, pins
+
+@benchmark
+def import_time(mem_filename, scale):
+    # Needs a fresh interpreter every time, so this includes its startup.
+    # Subtract an empty interpreter to get just hwiopy.
+    def run(code):
+        times = []
+        for ii in range(5):
+            _start = time.perf_counter()
+            subprocess.check_call([sys.executable, '-c', code],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(
+                __file__))))
+            times.append(time.perf_counter() - _start)
+        return min(times)
+    return max(run('import hwiopy') - run('pass'), 0)
+
+@benchmark
+def construct(mem_filename, scale):
+    namespace = {'BBB': hwiopy.platforms.BBB, 'mem': mem_filename}
+    return best_of('BBB(mem_filename=mem)', 10 * scale, namespace=namespace)
+
+@benchmark
+def create_pin(mem_filename, scale):
+    # Per pin, on a fresh device every run (the setup isn't timed)
+    namespace = {'BBB': hwiopy.platforms.BBB, 'mem': mem_filename,
+        'bank_pins': bank_pins}
+    return best_of('for pin_num in bank_pins: bbb.create_pin(pin_num, '
+        '"gpio")', 1, repeat=50 * scale, ops=len(bank_pins),
+        setup='bbb = BBB(mem_filename=mem)', namespace=namespace)
+
+@benchmark
+def configure(mem_filename, scale):
+    # Per pin, declared and configured from a spec on a fresh device
+    namespace = {'BBB': hwiopy.platforms.BBB, 'mem': mem_filename,
+        'spec': {pin_num: {'mode': 'gpio', 'direction': 'out'} for pin_num
+        in bank_pins}}
+    return best_of('bbb.configure(spec)', 1, repeat=50 * scale,
+        ops=len(bank_pins), setup='bbb = BBB(mem_filename=mem)',
+        namespace=namespace)
+
+@benchmark
+def start_stop(mem_filename, scale):
+    bbb, pins = make_device(mem_filename)
+    return best_of('bbb.on_start(); bbb.on_stop()', 100 * scale,
+        namespace={'bbb': bbb})
+
+@benchmark
+def start_stop_all(mem_filename, scale):
+    # Every gpio-capable header pin, spread over all four banks
+    bbb = hwiopy.platforms.BBB(mem_filename=mem_filename)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        bbb.configure({pin_num: {'mode': 'gpio', 'direction': 'in'} for 
+            pin_num in bbb.pins_for('gpio')})
+    return best_of('bbb.on_start(); bbb.on_stop()', 10 * scale,
+        namespace={'bbb': bbb})
+
+@memory_benchmark
+def declare_memory(mem_filename, scale):
+    # Everything a device holds on to after declaring every gpio-capable
+    # header pin. The maps are shared, so load them before measuring.
+    hwiopy.platforms.BBB(mem_filename=mem_filename)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    bbb = hwiopy.platforms.BBB(mem_filename=mem_filename)
+    with warnings.catch_warnings():
+        # 9_41 and 9_42 complain about having two terminals
+        warnings.simplefilter('ignore')
+        for pin_num in bbb.pins_for('gpio'):
+            bbb.create_pin(pin_num, 'gpio').config('in')
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+def running(stmt, number, ops, direction='out', **kwargs):
+    ''' Times stmt against a started device. The namespace has bbb, pins,
+    pin (the first one) and group (all of them).
+    '''
+    def run(mem_filename, scale):
+        bbb, pins = make_device(mem_filename, direction)
+        group = bbb.create_group(bank_pins)
+        with bbb:
+            namespace = {'bbb': bbb, 'pins': pins, 'pin': pins[0],
+                'group': group, 'array': array}
+            return best_of(stmt, number * scale, ops=ops,
+                namespace=namespace, **kwargs)
+    return run
+
+benchmarks['toggle_methods'] = running(
+    "pin.methods['output_high_nocheck'](); "
+    "pin.methods['output_low_nocheck']()", 100000, 2)
+benchmarks['toggle_fast'] = running(
+    'high(); low()', 100000, 2, setup='high = pin.high; low = pin.low')
+benchmarks['read_methods'] = running(
+    "pin.methods['input_nocheck']()", 100000, 1, direction='in')
+benchmarks['read_fast'] = running(
+    'read()', 100000, 1, direction='in', setup='read = pin.read')
+benchmarks['group_output'] = running(
+    'output((1, 0, 1, 0))', 100000, 1, setup='output = group.output_nocheck')
+# Bulk operations are per sample
+benchmarks['waveform_compile'] = running(
+    'group.compile_waveform(samples)', 10, 100000,
+    setup="samples = array('I', range(100000))")
+benchmarks['waveform_play'] = running(
+    'waveform.play()', 10, 100000, setup="waveform = "
+    "group.compile_waveform(array('I', range(100000)))")
+benchmarks['capture'] = running(
+    "bbb.system.capture('gpio2', 100000, out)", 10, 100000, direction='in',
+    setup="out = array('I', bytes(400000))")
+
+def run_all(mem_filename, scale, names):
+    results = {}
+    for name in names:
+        if name in memory_benchmarks:
+            results[name] = {'bytes': benchmarks[name](mem_filename, scale)}
+            print('    {:<20} {:>12,d} bytes'.format(name,
+                results[name]['bytes']))
+            continue
+        seconds = benchmarks[name](mem_filename, scale)
+        results[name] = {'seconds': seconds,
+            'per_second': 1 / seconds if seconds else None}
+        print('    {:<20} {:>12.3e} s/op {:>16,.0f} op/s'.format(name,
+            seconds, results[name]['per_second'] or 0))
+    return results
+
+def compare(results, baseline, tolerance):
+    ''' Prints the change against the baseline, and returns the names of
+    anything that got slower than the tolerance allows.
+    '''
+    regressions = []
+    print('\n    Against the baseline:')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        if 'bytes' in result:
+            key, what = 'bytes', 'memory'
+        else:
+            key, what = 'seconds', 'time'
+        ratio = result[key] / baseline[name][key]
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  <-- REGRESSION'
+        print('    {:<20} {:>8.2f}x the {}{}'.format(name, ratio, what,
+            flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*',
+        help='benchmarks to run (default: all of them)')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare',
+        help='baseline results (from --json) to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=.1,
+        help='how much slower counts as a regression (default: .1 = 10%%)')
+    parser.add_argument('--scale', type=int, default=1,
+        help='multiplies the number of iterations')
+    parser.add_argument('--mem-filename',
+        help='memory file to use instead of a scratch image')
+    args = parser.parse_args(argv)
+
+    names = args.names or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            parser.error('Unknown benchmark ' + name + '. Choose from: ' +
+                ', '.join(benchmarks))
+
+    print()
+    if args.mem_filename:
+        results = run_all(args.mem_filename, args.scale, names)
+    else:
+        # Sparse, and in shared memory if we've got it, so no disk gets
+        # involved.
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        with tempfile.NamedTemporaryFile(dir=shm) as memfile:
+            # Big enough for every gpio bank and the clock control registers
+            memfile.truncate(0x50000000)
+            results = run_all(memfile.name, args.scale, names)
+
+    report = {
+        'python': sys.version,
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'scale': args.scale,
+        'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+    print()
+    if regressions:
+        print('    Regressions: ' + ', '.join(regressions) + '\n')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
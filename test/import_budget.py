@@ -0,0 +1,93 @@
+''' Checks that importing hwiopy stays cheap. Each scenario runs in a fresh
+interpreter under python -X importtime, and fails if it takes longer than
+its budget, or imports something it has no business importing (like
+pkg_resources, or asyncio before anything asynchronous is used). Exits with
+status 1 on failure, so it can gate a release.
+
+    python3 test/import_budget.py
+    python3 test/import_budget.py --scale 10    (on a beaglebone, say)
+
+Times are the best of several runs, in milliseconds, and only count the
+imports the scenario triggers (not the interpreter's own startup).
+'''
+
+import argparse, os, subprocess, sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (code, budget in ms, modules that must not be imported)
+scenarios = {
+    'import hwiopy': ('import hwiopy', 10,
+        ('pkg_resources', 'asyncio', 'statistics', 'json',
+        'hwiopy.platforms', 'hwiopy.systems')),
+    'hwiopy.platforms': ('import hwiopy; hwiopy.platforms.BBB', 40,
+        ('pkg_resources', 'asyncio', 'statistics')),
+    # Loading the maps imports a little more (importlib.resources)
+    'BBB()': ('import hwiopy; hwiopy.platforms.BBB(mem_filename="")', 80,
+        ('pkg_resources', 'asyncio', 'statistics')),
+}
+
+def measure(code, startup=()):
+    ''' Returns (total ms, set of imported modules) for the code, not 
+    counting the modules in startup.
+    '''
+    env = dict(os.environ)
+    # Otherwise every run would pay for compiling hwiopy, too
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+        cwd=root, env=env, stderr=subprocess.PIPE, universal_newlines=True,
+        check=True)
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        name = name.rstrip()
+        if name.strip() in startup:
+            continue
+        modules.add(name.strip())
+        # Only top level entries, since the rest are already included
+        if not name.startswith('   '):
+            total += int(cumulative)
+    return total / 1000, modules
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1,
+        help='multiplies every budget, for slower machines')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Whatever the interpreter imports by itself isn't our problem
+    startup = measure('pass')[1]
+    # Warm up (and write the bytecode, if it's stale)
+    for code, budget, forbidden in scenarios.values():
+        measure(code, startup)
+
+    failed = []
+    print()
+    for name, (code, budget, forbidden) in scenarios.items():
+        runs = [measure(code, startup) for ii in range(args.repeat)]
+        best = min(ms for ms, modules in runs)
+        budget *= args.scale
+        imported = sorted(set(forbidden) & runs[0][1])
+        status = 'ok'
+        if best > budget:
+            status = 'OVER BUDGET'
+        if best > budget or imported:
+            failed.append(name)
+        print('    {:<20} {:>8.1f} ms (budget {:.0f} ms)  {}'.format(name,
+            best, budget, status))
+        if imported:
+            print('        but imported: ' + ', '.join(imported))
+    print()
+
+    if failed:
+        print('    Failed: ' + ', '.join(failed) + '\n')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+''' Runs the beaglebone overlay build (platform_setup.bbb_setup) against a
+stand-in dtc, which just copies the dts to the dtbo and logs the call, so
+it works anywhere. Checks that every gpio overlay gets built, that a second
+run skips all of them, and that changing one overlay (or losing its dtbo)
+only rebuilds that one.
+
+    python3 test/overlay_build.py
+    python3 test/overlay_build.py --dtc /usr/bin/dtc    (the real thing)
+'''
+
+import argparse, os, shutil, stat, sys, tempfile, time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import platform_setup
+
+fake_dtc = '''#!{python}
+import shutil, sys
+args = sys.argv[1:]
+shutil.copy(args[-1], args[args.index('-o') + 1])
+with open({log!r}, 'a') as f:
+    f.write(args[-1] + '\\n')
+'''
+
+def calls(log):
+    if not os.path.exists(log):
+        return 0
+    with open(log) as f:
+        return len(f.readlines())
+
+def build(dtc, overlays_dir, **kwargs):
+    _start = time.perf_counter()
+    setup = platform_setup.bbb_setup(dtc=dtc, overlays_dir=overlays_dir,
+        **kwargs)
+    return setup, time.perf_counter() - _start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dtc', help='real dtc to use instead')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp()
+    try:
+        overlays_dir = os.path.join(scratch, 'overlays')
+        log = os.path.join(scratch, 'dtc.log')
+        dtc = args.dtc
+        if dtc is None:
+            dtc = os.path.join(scratch, 'dtc')
+            with open(dtc, 'w') as f:
+                f.write(fake_dtc.format(python=sys.executable, log=log))
+            os.chmod(dtc, os.stat(dtc).st_mode | stat.S_IEXEC)
+
+        print()
+        # From scratch: everything gets built
+        setup, duration = build(dtc, overlays_dir, workers=args.workers)
+        total = len(setup.built)
+        assert total and not setup.skipped, 'Nothing was built.'
+        assert args.dtc or calls(log) == total
+        print('    Built {} overlays in {:.2f} s'.format(total, duration))
+
+        # Again: nothing to do
+        setup, duration = build(dtc, overlays_dir, workers=args.workers)
+        assert not setup.built and len(setup.skipped) == total, \
+            'Cached overlays were rebuilt.'
+        print('    Rebuilt nothing in {:.3f} s'.format(duration))
+
+        # Lose one dtbo: just that one is rebuilt
+        name = setup.skipped[0]
+        os.remove(os.path.join(overlays_dir, name + '-' +
+            setup.version + '.dtbo'))
+        setup, duration = build(dtc, overlays_dir, workers=args.workers)
+        assert setup.built == [name], setup.built
+        print('    Rebuilt the missing {} only'.format(name))
+
+        # Forced: everything again
+        setup, duration = build(dtc, overlays_dir, workers=args.workers,
+            force=True)
+        assert len(setup.built) == total
+        print('    Forced rebuild of {} overlays in {:.2f} s\n'.format(total,
+            duration))
+    finally:
+        shutil.rmtree(scratch)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
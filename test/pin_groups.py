@@ -0,0 +1,44 @@
+''' Checks the bookkeeping between pins and the groups made from them. Doesn't
+need a beaglebone: runs against a sparse file standing in for /dev/mem.
+'''
+
+import os, sys, tempfile
+
+# Make sure we're testing this checkout, not some installed hwiopy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import hwiopy
+
+failed = False
+
+with tempfile.NamedTemporaryFile() as memfile:
+    # Big enough to cover every gpio bank and the clock control registers
+    memfile.truncate(0x50000000)
+
+    bbb = hwiopy.platforms.BBB(mem_filename=memfile.name)
+    bbb.create_pin('8_7', 'gpio').config('out')
+    bbb.create_pin('8_8', 'gpio').config('out')
+    bbb.create_pin('8_9', 'gpio').config('out')
+    bbb.create_group(['8_7', '8_8'], 'pair')
+
+    # A grouped pin can't be released: the group would still drive it
+    try:
+        bbb.release_pin('8_8')
+    except ValueError as error:
+        print('Releasing a grouped pin:', error)
+    else:
+        print('Releasing a grouped pin did not raise.')
+        failed = True
+    if '8_8' not in bbb.pinout:
+        print('The grouped pin was removed from the pinout anyway.')
+        failed = True
+
+    # But anything outside of a group can be
+    bbb.release_pin('8_9')
+    if '8_9' in bbb.pinout:
+        print('The ungrouped pin was not released.')
+        failed = True
+
+if failed:
+    sys.exit(1)
+print('Pin groups ok.')
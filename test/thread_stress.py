@@ -0,0 +1,94 @@
+''' Hammers the gpio registers from several threads at once, to check the
+concurrency model (see the cortexA8 docstring), and reports the throughput.
+Doesn't need a beaglebone: runs against a sparse file standing in for
+/dev/mem. Works the same on free-threaded builds, where the threads really
+do run at the same time.
+
+Every thread owns one pin of the same bank (so they all share its oe) and
+flips its direction over and over, which is a read-modify-write of the oe. If
+any of those were to interleave, some thread's direction would get lost.
+Meanwhile, more threads drive set/clear writes, which are lock-free.
+'''
+
+import os, sys, tempfile, threading, time
+
+# Make sure we're testing this checkout, not some installed hwiopy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import hwiopy
+
+nn = 20000
+writers = (1, 2, 4, 8)
+# Bank gpio2, which is at 0x481AC000. oe is at offset 0x134.
+bank_pins = ['8_7', '8_8', '8_9', '8_10', '8_18', '8_27', '8_28', '8_29']
+oe_index = 0x134 // 4
+
+# Switch threads as often as possible, to give any races a chance to show
+sys.setswitchinterval(1e-6)
+
+def run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    _start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - _start
+
+with tempfile.NamedTemporaryFile() as memfile:
+    # Big enough to cover every gpio bank and the clock control registers
+    memfile.truncate(0x50000000)
+
+    bbb = hwiopy.platforms.BBB(mem_filename=memfile.name)
+    pins = [bbb.create_pin(pin_num, 'gpio') for pin_num in bank_pins]
+    for pin in pins:
+        pin.config('in')
+
+    with bbb as beagle:
+        # Read-modify-write stress
+        # ------------------------------------------------------------
+        oe = bbb.system._get_register_view('gpio2')[oe_index:oe_index + 1]
+        lost = []
+
+        def flipper(pin):
+            channel = int(bbb.system._resolve_mode.describe(pin.terminal,
+                'gpio')['register_detail'])
+            mask = 1 << channel
+            def flip():
+                # Nobody else touches our bit, so it should always read back
+                # as whatever we last set it to.
+                misses = 0
+                for ii in range(nn):
+                    pin.config('out')
+                    if oe[0] & mask:
+                        misses += 1
+                    pin.config('in')
+                    if not oe[0] & mask:
+                        misses += 1
+                lost.append(misses)
+            return flip
+
+        duration = run_threads([flipper(pin) for pin in pins])
+        oe.release()
+
+        print('\n    oe read-modify-write, ' + str(len(pins)) + ' threads:\n'
+            '    Writes/s: ' + str(2 * nn * len(pins) / duration))
+        if sum(lost):
+            raise AssertionError(str(sum(lost)) + ' oe updates were lost.')
+        print('    No lost updates.\n')
+
+        # Lock-free set/clear throughput
+        # ------------------------------------------------------------
+        for count in writers:
+            def toggler(pin):
+                def toggle(high=pin.high, low=pin.low):
+                    for ii in range(nn):
+                        high()
+                        low()
+                return toggle
+
+            duration = run_threads([toggler(pins[ii % len(pins)]) for ii in
+                range(count)])
+            print('    set/clear, ' + str(count) + ' threads: ' +
+                str(2 * nn * count / duration) + ' writes/s')
+    print()
@@ -0,0 +1,70 @@
+''' Checks that the gpio hot paths don't allocate anything per call. Doesn't
+need a beaglebone: runs against a sparse file standing in for /dev/mem.
+
+Note that a register value above 256 would need a fresh int object on every
+read (python caches the small ones), so the input register is left at zero.
+'''
+
+import os, sys, tempfile, tracemalloc
+from itertools import repeat
+
+# Make sure we're testing this checkout, not some installed hwiopy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import hwiopy
+
+nn = 100000
+
+with tempfile.NamedTemporaryFile() as memfile:
+    # Big enough to cover every gpio bank and the clock control registers
+    memfile.truncate(0x50000000)
+
+    bbb = hwiopy.platforms.BBB(mem_filename=memfile.name)
+    test_led = bbb.create_pin('8_7', 'gpio', 'test_led')
+    test_led.config('out')
+    test_in = bbb.create_pin('8_8', 'gpio', 'test_in')
+    test_in.config('in')
+
+    with bbb as beagle:
+        hot_paths = {
+            'output_high_nocheck': test_led.methods['output_high_nocheck'],
+            'output_low_nocheck': test_led.methods['output_low_nocheck'],
+            'input_nocheck': test_in.methods['input_nocheck'],
+            'high': test_led.high,
+            'low': test_led.low,
+            'read': test_in.read,
+        }
+
+        def measure(method):
+            # Note that repeat(), unlike range(), doesn't make new ints
+            loop = repeat(None, nn)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            for ii in loop:
+                method()
+            current, peak = tracemalloc.get_traced_memory()
+            return current - before, peak - before
+
+        def best_of(method, repeats=5):
+            # Other things (the measurement included) make the odd object 
+            # now and then, so take the best run, timeit-style.
+            results = [measure(method) for ii in range(repeats)]
+            return (min(result[0] for result in results), 
+                min(result[1] for result in results))
+
+        tracemalloc.start()
+        # Getting the traced memory allocates a little by itself, so find out
+        # how much with something that definitely doesn't allocate.
+        baseline = best_of(tuple)
+        failed = False
+        for name, method in hot_paths.items():
+            kept, peak = best_of(method)
+            print('    ' + name + ': ' + str(kept - baseline[0]) + ' bytes '
+                'kept, ' + str(peak - baseline[1]) + ' bytes peak')
+            if (kept, peak) != baseline:
+                failed = True
+        tracemalloc.stop()
+
+if failed:
+    raise AssertionError('A gpio hot path allocated memory.')
+print('\n    No allocations in ' + str(nn) + ' calls of each.\n')